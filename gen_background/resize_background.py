@@ -1,10 +1,50 @@
 import cv2
 import argparse
 import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from tqdm import tqdm
 
-def resize_image(input_path, output_path, target_width, target_height, interpolation=cv2.INTER_LINEAR):
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from gen_common.image_size import read_image_size
+from gen_common.manifest import write_temp
+
+# 支持的图像格式
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff')
+
+# 解码器可以直接按比例缩小解码的格式（JPEG 在 DCT 域缩小，不会先解出全尺寸图像）
+REDUCED_DECODE_EXTENSIONS = ('.jpg', '.jpeg')
+REDUCED_DECODE_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+
+def list_image_files(input_folder):
+    """单次扫描文件夹，返回扩展名（不区分大小写）为图像格式的文件路径"""
+    with os.scandir(input_folder) as entries:
+        return sorted(Path(e.path) for e in entries if e.is_file() and e.name.lower().endswith(IMAGE_EXTENSIONS))
+
+def read_flag(input_path, target_width, target_height):
+    """
+    选择读取方式：源图至少是目标尺寸的2倍时，按缩小后仍不小于目标尺寸的最大倍数缩小解码
+
+    源图尺寸只读取文件头得到；不支持缩小解码的格式按原尺寸读取。
+    """
+    if not input_path.lower().endswith(REDUCED_DECODE_EXTENSIONS):
+        return cv2.IMREAD_COLOR
+    size = read_image_size(input_path, decode_fallback=False)
+    if size is None:
+        return cv2.IMREAD_COLOR
+    for factor, flag in REDUCED_DECODE_FLAGS:
+        if size[0] >= target_width * factor and size[1] >= target_height * factor:
+            return flag
+    return cv2.IMREAD_COLOR
+
+def is_current(input_path, output_path, target_width, target_height):
+    """输出文件比输入文件新，并且已经是目标尺寸（只读取文件头）"""
+    if not os.path.exists(output_path) or os.path.getmtime(output_path) < os.path.getmtime(input_path):
+        return False
+    return read_image_size(output_path) == (target_width, target_height)
+
+def resize_image(input_path, output_path, target_width, target_height, interpolation=cv2.INTER_LINEAR, reduced_decode=True):
     """
     将图像缩放到指定分辨率
     
@@ -14,13 +54,15 @@ def resize_image(input_path, output_path, target_width, target_height, interpola
         target_width: 目标宽度
         target_height: 目标高度
         interpolation: 插值方法，默认为线性插值
+        reduced_decode: 大幅缩小时是否按比例缩小解码
     
     返回:
         bool: 是否成功
     """
     try:
         # 读取图像
-        img = cv2.imread(input_path)
+        flag = read_flag(input_path, target_width, target_height) if reduced_decode else cv2.IMREAD_COLOR
+        img = cv2.imread(input_path, flag)
         if img is None:
             print(f"错误: 无法读取图像 '{input_path}'")
             return False
@@ -31,9 +73,10 @@ def resize_image(input_path, output_path, target_width, target_height, interpola
         # 确保输出目录存在
         os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
         
-        # 保存图像
-        result = cv2.imwrite(output_path, resized_img)
+        # 保存图像：先写临时文件再重命名，中断时不会留下尺寸正确但内容不完整、又会被当作已完成而跳过的输出
+        result, encoded = cv2.imencode(os.path.splitext(output_path)[1], resized_img)
         if result:
+            os.replace(write_temp(output_path, encoded.tobytes()), output_path)
             return True
         else:
             print(f"错误: 无法保存图像到 '{output_path}'")
@@ -43,7 +86,15 @@ def resize_image(input_path, output_path, target_width, target_height, interpola
         print(f"处理图像时出错 '{input_path}': {str(e)}")
         return False
 
-def resize_folder(input_folder, output_folder, target_width, target_height, interpolation=cv2.INTER_LINEAR):
+def _init_worker():
+    # 每个进程只处理一张图，OpenCV内部不再开线程
+    cv2.setNumThreads(1)
+
+def _resize_task(task):
+    return resize_image(*task)
+
+def resize_folder(input_folder, output_folder, target_width, target_height, interpolation=cv2.INTER_LINEAR,
+                  workers=1, force=False, reduced_decode=True):
     """
     批量处理文件夹中的所有图片
     
@@ -53,34 +104,41 @@ def resize_folder(input_folder, output_folder, target_width, target_height, inte
         target_width: 目标宽度
         target_height: 目标高度
         interpolation: 插值方法
+        workers: 并行处理的进程数
+        force: 为True时不跳过已是最新的输出，全部重新缩放
+        reduced_decode: 大幅缩小时是否按比例缩小解码
     """
     # 确保输出目录存在
     os.makedirs(output_folder, exist_ok=True)
     
-    # 支持的图像格式
-    image_extensions = ['.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff']
-    
     # 获取所有图片文件
-    image_files = []
-    for ext in image_extensions:
-        image_files.extend(list(Path(input_folder).glob(f'*{ext}')))
-        image_files.extend(list(Path(input_folder).glob(f'*{ext.upper()}')))
+    image_files = list_image_files(input_folder)
     
     if not image_files:
         print(f"错误: 在 '{input_folder}' 中未找到图像文件")
         return False
     
-    print(f"找到 {len(image_files)} 个图像文件需要处理")
-    successful_count = 0
+    # 输出比输入新且已是目标尺寸的图片不再处理
+    tasks = []
+    for input_path in image_files:
+        output_path = os.path.join(output_folder, input_path.name)
+        if not force and is_current(str(input_path), output_path, target_width, target_height):
+            continue
+        tasks.append((str(input_path), output_path, target_width, target_height, interpolation, reduced_decode))
+    skipped = len(image_files) - len(tasks)
+    
+    print(f"找到 {len(image_files)} 个图像文件，其中 {skipped} 个已是最新，{len(tasks)} 个需要处理")
     
     # 使用tqdm显示进度条
-    for input_path in tqdm(image_files, desc="缩放处理进度"):
-        output_path = os.path.join(output_folder, input_path.name)
-        if resize_image(str(input_path), output_path, target_width, target_height, interpolation):
-            successful_count += 1
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+            results = list(tqdm(executor.map(_resize_task, tasks), total=len(tasks), desc="缩放处理进度"))
+    else:
+        results = [_resize_task(task) for task in tqdm(tasks, desc="缩放处理进度")]
+    successful_count = sum(results)
     
-    print(f"处理完成: {successful_count}/{len(image_files)} 个文件成功缩放到 {target_width}x{target_height}")
-    return successful_count > 0
+    print(f"处理完成: {successful_count}/{len(tasks)} 个文件成功缩放到 {target_width}x{target_height}，跳过 {skipped} 个")
+    return successful_count + skipped > 0
 
 def main():
     parser = argparse.ArgumentParser(description='将图像缩放到指定分辨率')
@@ -91,6 +149,9 @@ def main():
     parser.add_argument('--method', type=str, default='linear', 
                         choices=['nearest', 'linear', 'cubic', 'area', 'lanczos'],
                         help='插值方法 (默认: linear)')
+    parser.add_argument('--workers', type=int, default=1, help='并行处理的进程数')
+    parser.add_argument('--force', action='store_true', help='重新缩放所有图片，不跳过已是最新的输出')
+    parser.add_argument('--full_decode', action='store_true', help='始终解码全尺寸图像，不按比例缩小解码')
     
     args = parser.parse_args()
     
@@ -119,7 +180,10 @@ def main():
             output_folder, 
             args.width, 
             args.height, 
-            interpolation
+            interpolation,
+            args.workers,
+            args.force,
+            not args.full_decode
         )
         
         if success:
@@ -132,7 +196,7 @@ def main():
             output_path = input_path.parent / f"{input_path.stem}_resized{input_path.suffix}"
             args.output = str(output_path)
         
-        success = resize_image(args.input, args.output, args.width, args.height, interpolation)
+        success = resize_image(args.input, args.output, args.width, args.height, interpolation, not args.full_decode)
         
         if success:
             print(f"图像处理完成: '{args.output}'")
@@ -0,0 +1,132 @@
+import json
+import os
+
+import numpy as np
+
+# 与分割标签一致的类别编号
+CATEGORIES = [
+    {'id': 1, 'name': 'madian'},
+    {'id': 2, 'name': 'yuyan'},
+    {'id': 3, 'name': 'qipao'},
+]
+CATEGORY_IDS = {category['name']: category['id'] for category in CATEGORIES}
+
+
+def encode_rle(mask, x, y, height, width):
+    """
+    将放置在整图 (x, y) 处的局部掩码编码为整图大小的COCO非压缩RLE
+
+    COCO RLE 按列优先顺序计数，从背景（0）的游程开始。只遍历局部掩码，不需要构造整图大小的数组。
+
+    :param mask: 局部布尔掩码 (h, w)
+    :param x: 局部掩码左上角在整图中的列坐标
+    :param y: 局部掩码左上角在整图中的行坐标
+    :param height: 整图高度
+    :param width: 整图宽度
+    :return: {'size': [height, width], 'counts': [...]}
+    """
+    # 对转置后的掩码取非零位置，得到按列优先排序的 (列, 行)
+    cols, rows = np.nonzero(mask.T)
+    indices = (cols.astype(np.int64) + x) * height + (rows.astype(np.int64) + y)
+
+    total = height * width
+    if len(indices) == 0:
+        return {'size': [height, width], 'counts': [total]}
+
+    # 连续前景的起点和终点
+    breaks = np.flatnonzero(np.diff(indices) != 1)
+    starts = np.concatenate(([indices[0]], indices[breaks + 1]))
+    ends = np.concatenate((indices[breaks], [indices[-1]])) + 1
+
+    counts = np.empty(len(starts) * 2 + 1, dtype=np.int64)
+    counts[0::2][:len(starts)] = starts - np.concatenate(([0], ends[:-1]))
+    counts[1::2] = ends - starts
+    counts[-1] = total - ends[-1]
+    return {'size': [height, width], 'counts': counts.tolist()}
+
+
+def decode_rle(rle):
+    """将COCO非压缩RLE解码为布尔掩码，用于检查"""
+    height, width = rle['size']
+    flat = np.zeros(height * width, dtype=bool)
+    position = 0
+    for k, count in enumerate(rle['counts']):
+        if k % 2 == 1:
+            flat[position:position + count] = True
+        position += count
+    return flat.reshape((width, height)).T
+
+
+def build_instances(placements, category, height, width, image_id=0):
+    """
+    根据放置信息生成实例标注
+
+    :param placements: [(x, y, patch_id, label_mask), ...]，label_mask 为小图对应目标图的前景布尔掩码
+    :param category: 缺陷类别名称
+    :param height: 整图高度
+    :param width: 整图宽度
+    :return: COCO风格的 annotation 列表
+    """
+    annotations = []
+    for x, y, patch_id, label_mask in placements:
+        rows = np.flatnonzero(label_mask.any(axis=1))
+        cols = np.flatnonzero(label_mask.any(axis=0))
+        if len(rows) == 0:
+            continue
+        bbox = [int(x + cols[0]), int(y + rows[0]), int(cols[-1] - cols[0] + 1), int(rows[-1] - rows[0] + 1)]
+        annotations.append({
+            'id': len(annotations) + 1,
+            'image_id': image_id,
+            'category_id': CATEGORY_IDS[category],
+            'category': category,
+            'patch_id': patch_id,
+            'bbox': bbox,
+            'area': int(np.count_nonzero(label_mask)),
+            'iscrowd': 0,
+            'segmentation': encode_rle(label_mask, x, y, height, width),
+        })
+    return annotations
+
+
+def save_annotations(target_output_path, image_path, height, width, category, placements, annotation_format='json'):
+    """
+    将单张生成图像的实例标注保存为与目标掩码同名的旁路文件
+
+    :param target_output_path: 目标掩码路径，标注文件与其同名、扩展名为 .json 或 .jsonl
+    :param image_path: 生成图像的路径
+    :param placements: [(x, y, patch_id, label_mask), ...]
+    :param annotation_format: 'json'（COCO风格，单个文件包含 images/annotations/categories）
+                              或 'jsonl'（每行一个实例的紧凑格式）
+    :return: 标注文件路径
+    """
+    annotations = build_instances(placements, category, height, width)
+    base_path = os.path.splitext(target_output_path)[0]
+    file_name = os.path.basename(image_path)
+
+    if annotation_format == 'jsonl':
+        annotation_path = base_path + '.jsonl'
+        with open(annotation_path, 'w') as f:
+            for annotation in annotations:
+                record = {
+                    'file_name': file_name,
+                    'height': height,
+                    'width': width,
+                    'category': annotation['category'],
+                    'patch_id': annotation['patch_id'],
+                    'bbox': annotation['bbox'],
+                    'area': annotation['area'],
+                    'rle': annotation['segmentation']['counts'],
+                }
+                f.write(json.dumps(record, separators=(',', ':')) + '\n')
+    elif annotation_format == 'json':
+        annotation_path = base_path + '.json'
+        coco = {
+            'images': [{'id': 0, 'file_name': file_name, 'height': height, 'width': width}],
+            'annotations': annotations,
+            'categories': CATEGORIES,
+        }
+        with open(annotation_path, 'w') as f:
+            json.dump(coco, f, separators=(',', ':'))
+    else:
+        raise ValueError(f"不支持的标注格式: {annotation_format}")
+    return annotation_path
@@ -0,0 +1,88 @@
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from gen_common.illumination import light_field, shadow_field, field_error
+
+
+def reference_light_field(height, width, lights):
+    """原 change_light.py 中逐光源 float64 的实现，作为对照"""
+    light_mask = np.zeros((height, width), dtype=np.float32)
+    for cx, cy, intensity, radius in lights:
+        y, x = np.ogrid[:height, :width]
+        distance_from_center = np.sqrt((x - cx)**2 + (y - cy)**2)
+        single_light_mask = np.clip(intensity * (1 - distance_from_center / radius), 0, intensity)
+        light_mask += single_light_mask
+    return light_mask
+
+
+def reference_shadow_field(height, width, shadows):
+    """原 cast_shadow.py 中逐阴影 float64 的实现，作为对照"""
+    shadow_mask = np.ones((height, width), dtype=np.float32)
+    for cx, cy, intensity, radius in shadows:
+        y, x = np.ogrid[:height, :width]
+        distance_from_center = np.sqrt((x - cx)**2 + (y - cy)**2)
+        distance_factor = np.clip(distance_from_center / radius, 0, 1)
+        single_shadow_mask = intensity + (1 - intensity) * distance_factor
+        single_shadow_mask = np.clip(single_shadow_mask, intensity, 1.0)
+        shadow_mask *= single_shadow_mask
+    return shadow_mask
+
+
+def make_sources(num_sources, width, height, intensity_range, rng):
+    return [(rng.randint(0, width), rng.randint(0, height), rng.uniform(*intensity_range), rng.uniform(500, 1500))
+            for _ in range(num_sources)]
+
+
+def time_field(func, height, width, sources_list, **kwargs):
+    start = time.perf_counter()
+    for sources in sources_list:
+        func(height, width, sources, **kwargs)
+    return (time.perf_counter() - start) / len(sources_list)
+
+
+def bench(name, reference_func, fast_func, intensity_range, value_scale, args, rng):
+    """
+    对比原实现与新实现（不同粗网格倍数）的耗时和误差
+
+    :param value_scale: 将场换算为灰度误差的系数（光照场为1，阴影系数场按255计）
+    """
+    print(f"[{name}]")
+    for num_sources in args.lights:
+        sources_list = [make_sources(num_sources, args.width, args.height, intensity_range, rng) for _ in range(args.repeats)]
+        reference_time = time_field(reference_func, args.height, args.width, sources_list)
+        reference = reference_func(args.height, args.width, sources_list[0])
+        print(f"  数量 {num_sources:2d}: 原实现 {reference_time * 1000:8.1f} ms/张")
+
+        for scale in args.scales:
+            fast_time = time_field(fast_func, args.height, args.width, sources_list, scale=scale)
+            approx = fast_func(args.height, args.width, sources_list[0], scale=scale)
+            max_error, mean_error = field_error(reference, approx)
+            print(f"    scale {scale:2d}: {fast_time * 1000:8.1f} ms/张, 加速 {reference_time / fast_time:6.1f}x, "
+                  f"最大误差 {max_error * value_scale:.3f} 灰度, 平均误差 {mean_error * value_scale:.4f} 灰度")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='光照场/阴影场计算耗时与误差对比')
+    parser.add_argument('--width', type=int, default=5472, help='图像宽度')
+    parser.add_argument('--height', type=int, default=3648, help='图像高度')
+    parser.add_argument('--repeats', type=int, default=3, help='每种光源数量重复的次数')
+    parser.add_argument('--lights', type=int, nargs='+', default=[1, 5, 10], help='测试的光源/阴影数量')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 4, 8], help='测试的粗网格缩小倍数（1为全分辨率）')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子')
+
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"图像尺寸: {args.width}x{args.height}, 每组重复 {args.repeats} 次")
+    bench('光照场', reference_light_field, light_field, (10, 20), 1, args, rng)
+    bench('阴影场', reference_shadow_field, shadow_field, (0.75, 0.95), 255, args, rng)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+import functools
+
+import cv2
+
+# 拼接后平滑处理的高斯核大小，按条带处理时上下各多取核半径行
+BLUR_KSIZE = 7
+
+
+@functools.lru_cache(maxsize=None)
+def load_background(background_image_path):
+    """解码灰度背景图，每个进程每张背景只解码一次；读取失败时返回None"""
+    return cv2.imread(background_image_path, cv2.IMREAD_GRAYSCALE)
+
+
+@functools.lru_cache(maxsize=8)
+def resized_background(background_image_path, width, height):
+    """
+    缩放到指定大小的灰度背景，每种尺寸只缩放一次
+
+    返回的数组在多次调用之间共享，调用方不能原地修改。
+    """
+    background_image = load_background(background_image_path)
+    if background_image is None:
+        return None
+    return cv2.resize(background_image, (width, height))
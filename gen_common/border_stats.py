@@ -0,0 +1,187 @@
+import functools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+# 读取背景统计时使用的图像扩展名，与 gen_background.py 原先一致
+STATS_EXTENSIONS = ('.png', '.jpg', '.bmp')
+
+
+def list_images(img_folder, extensions=STATS_EXTENSIONS):
+    """返回文件夹中的图片路径（按文件名排序）"""
+    return [os.path.join(img_folder, f) for f in sorted(os.listdir(img_folder)) if f.endswith(extensions)]
+
+
+def border_pixels(image):
+    """
+    提取图像上、下、左、右四条边框的像素（四个角各计入两次，与原先逐边 extend 一致）
+
+    :return: (N,) 或 (N, 通道数) 的数组
+    """
+    return np.concatenate([image[0], image[-1], image[:, 0], image[:, -1]])
+
+
+def border_histogram(image, channels=None):
+    """
+    统计图像边框像素的逐通道256级直方图
+
+    :param image: (H, W) 灰度图或 (H, W, C) 多通道图
+    :param channels: 只统计这些通道下标（如 (2,) 表示 BGR 中的 R），None 时统计全部通道
+    :return: (C, 256) 的 int64 直方图，灰度图 C 为1；多通道时通道顺序与图像（OpenCV 为 BGR）或 channels 相同
+    """
+    pixels = border_pixels(image)
+    if pixels.ndim == 1:
+        pixels = pixels[:, None]
+    if channels is None:
+        channels = range(pixels.shape[1])
+    return np.stack([np.bincount(pixels[:, c], minlength=256) for c in channels]).astype(np.int64)
+
+
+def image_border_histogram(img_path, flags=cv2.IMREAD_COLOR, channels=None):
+    """读取图片并统计边框直方图，读取失败时返回None"""
+    image = cv2.imread(img_path, flags)
+    if image is None:
+        return None
+    return border_histogram(image, channels)
+
+
+def _histogram_list(img_path, flags, channels=None):
+    """供统计缓存使用：返回可 JSON 编码的边框直方图"""
+    hist = image_border_histogram(img_path, flags, channels)
+    return None if hist is None else hist.tolist()
+
+
+def _histogram_chunk(img_paths, flags, channels=None):
+    """累加一组图片的边框直方图，返回 (直方图之和, 读取失败的路径)"""
+    total = None
+    failed = []
+    for img_path in img_paths:
+        hist = image_border_histogram(img_path, flags, channels)
+        if hist is None:
+            failed.append(img_path)
+            continue
+        total = hist if total is None else total + hist
+    return total, failed
+
+
+def _init_worker():
+    # 每个进程只解码一张图，OpenCV内部不再开线程
+    cv2.setNumThreads(1)
+
+
+def folder_border_histogram(img_paths, flags=cv2.IMREAD_COLOR, workers=1, chunks_per_worker=4, cache=None, channels=None):
+    """
+    单次流式遍历图片，累加所有边框像素的逐通道直方图
+
+    内存只占一个 (C, 256) 的直方图，与图片数量无关；workers 大于1时把图片分片交给进程池，再把各片的直方图相加。
+    给定统计缓存时，每张图片的直方图从缓存读取，只解码缓存中没有的图片。
+
+    :param img_paths: 图片路径列表
+    :param flags: cv2.imread 的读取方式
+    :param workers: 进程数
+    :param cache: 可选的 StatsCache
+    :param channels: 只统计这些通道下标，None 时统计全部通道；结果的行与 channels 一一对应
+    :return: ((C, 256) 直方图或None, 读取失败的路径列表)
+    """
+    if cache is not None:
+        # 只统计部分通道时缓存类型带上通道下标，与全通道的统计分开保存
+        kind = f'border_hist/{flags}' if channels is None else f'border_hist/{flags}/{",".join(map(str, channels))}'
+        hists = cache.map(img_paths, kind, functools.partial(_histogram_list, flags=flags, channels=channels), workers)
+        total = None
+        failed = []
+        for img_path, hist in zip(img_paths, hists):
+            if hist is None:
+                failed.append(img_path)
+                continue
+            hist = np.asarray(hist, dtype=np.int64)
+            total = hist if total is None else total + hist
+        return total, failed
+    if workers > 1 and len(img_paths) > 1:
+        num_chunks = min(len(img_paths), workers * chunks_per_worker)
+        chunks = [img_paths[i::num_chunks] for i in range(num_chunks)]
+        total = None
+        failed = []
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+            for hist, chunk_failed in executor.map(_histogram_chunk, chunks, [flags] * len(chunks), [channels] * len(chunks)):
+                failed.extend(chunk_failed)
+                if hist is not None:
+                    total = hist if total is None else total + hist
+        return total, failed
+    return _histogram_chunk(img_paths, flags, channels)
+
+
+def histogram_percentile(hist, q):
+    """
+    由单通道直方图计算分位数，与对原始像素调用 np.percentile（线性插值）的结果一致
+
+    :param hist: (256,) 直方图
+    :param q: 百分位（0～100）
+    """
+    cumulative = np.cumsum(hist)
+    position = q / 100 * (cumulative[-1] - 1)
+    lower_rank = int(np.floor(position))
+    upper_rank = min(lower_rank + 1, int(cumulative[-1]) - 1)
+    # 排序后第 k 个像素的值：第一个累计数超过 k 的灰度级
+    lower = int(np.searchsorted(cumulative, lower_rank, side='right'))
+    upper = int(np.searchsorted(cumulative, upper_rank, side='right'))
+    return lower + (position - lower_rank) * (upper - lower)
+
+
+def histogram_mean_std(hist):
+    """由直方图计算均值和标准差（总体标准差，与 norm.fit 的最大似然估计一致）"""
+    values = np.arange(len(hist), dtype=np.float64)
+    count = hist.sum()
+    mean = float((hist * values).sum() / count)
+    std = float(np.sqrt((hist * (values - mean) ** 2).sum() / count))
+    return mean, std
+
+
+def trimmed_stats(hist, lower_q=3, upper_q=97):
+    """
+    去掉分位数范围之外的像素后计算均值和标准差
+
+    与原先 channel[(channel >= np.percentile(channel, 3)) & (channel <= np.percentile(channel, 97))] 后 norm.fit 一致。
+
+    :param hist: (256,) 直方图
+    :return: (均值, 标准差)
+    """
+    lower = histogram_percentile(hist, lower_q)
+    upper = histogram_percentile(hist, upper_q)
+    values = np.arange(len(hist))
+    trimmed = np.where((values >= lower) & (values <= upper), hist, 0)
+    return histogram_mean_std(trimmed)
+
+
+def inverse_cdf_lut(hist, bits=16):
+    """
+    由单通道直方图构造逆CDF查找表，用于按经验分布快速采样
+
+    查找表有 2**bits 项：第 r 项为均匀分布分位点 (r + 0.5) / 2**bits 对应的灰度级。
+    抽取 [0, 2**bits) 的均匀整数后查表，即等价于从原始像素中有放回地随机抽取（概率量化误差不超过 2**-bits）。
+
+    :param hist: (256,) 直方图
+    :return: (2**bits,) 的 uint8 查找表
+    """
+    cdf = np.cumsum(hist, dtype=np.float64)
+    cdf /= cdf[-1]
+    size = 1 << bits
+    quantiles = (np.arange(size, dtype=np.float64) + 0.5) / size
+    return np.searchsorted(cdf, quantiles, side='right').clip(0, len(hist) - 1).astype(np.uint8)
+
+
+def sample_lut(lut, shape, rng):
+    """
+    按逆CDF查找表采样
+
+    :param lut: inverse_cdf_lut 返回的查找表
+    :param shape: 输出形状
+    :param rng: numpy.random.Generator
+    :return: uint8 数组
+    """
+    if len(lut) == 1 << 16:
+        indices = rng.integers(0, 1 << 16, size=shape, dtype=np.uint16)
+    else:
+        indices = rng.integers(0, len(lut), size=shape, dtype=np.uint32)
+    return lut[indices]
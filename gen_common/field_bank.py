@@ -0,0 +1,170 @@
+import argparse
+import json
+import os
+import random
+import sys
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from gen_common.illumination import sample_lights, sample_shadows, light_field, shadow_field
+
+# 各类场的默认参数范围，与 change_light.py / cast_shadow.py 中一致
+DEFAULT_INTENSITY = {
+    'light': (10, 20),
+    'shadow': (0.75, 0.95),
+}
+
+
+def bank_paths(path):
+    """场库由 .npy 数据文件和 .json 元数据文件组成"""
+    base = os.path.splitext(path)[0]
+    return base + '.npy', base + '.json'
+
+
+def build_bank(path, kind='light', count=300, height=3648, width=5472, scale=8, margin=1.25,
+               max_sources=10, intensity_range=None, radius_range=(500, 1500), seed=0):
+    """
+    预先生成一批光照场或阴影场，保存为可内存映射的 .npy 文件
+
+    场本身非常平滑，因此只保存缩小 scale 倍的粗网格，使用时再裁剪并插值到原图大小。
+    画布比目标图像大 margin 倍，为随机裁剪留出偏移空间。
+
+    :param path: 场库路径（.npy）
+    :param kind: 'light'（加性光照）或 'shadow'（乘性阴影系数）
+    :param count: 场的数量
+    :param height: 目标图像高度
+    :param width: 目标图像宽度
+    :param scale: 粗网格的缩小倍数
+    :param margin: 画布相对目标图像的放大倍数
+    """
+    if kind not in DEFAULT_INTENSITY:
+        raise ValueError(f"不支持的场类型: {kind}")
+    intensity_range = tuple(intensity_range or DEFAULT_INTENSITY[kind])
+    canvas_height = int(np.ceil(height * margin))
+    canvas_width = int(np.ceil(width * margin))
+
+    data_path, meta_path = bank_paths(path)
+    os.makedirs(os.path.dirname(os.path.abspath(data_path)), exist_ok=True)
+
+    random.seed(seed)
+    bank = None
+    for i in range(count):
+        # 只保存粗网格上的场
+        if kind == 'light':
+            sources = sample_lights(canvas_width, canvas_height, max_sources, intensity_range, radius_range)
+            coarse = light_field(canvas_height, canvas_width, sources, scale=scale, upsample=False)
+        else:
+            sources = sample_shadows(canvas_width, canvas_height, max_sources, intensity_range, radius_range)
+            coarse = shadow_field(canvas_height, canvas_width, sources, scale=scale, upsample=False)
+        if bank is None:
+            bank = np.lib.format.open_memmap(data_path, mode='w+', dtype=np.float32, shape=(count,) + coarse.shape)
+        bank[i] = coarse
+    field_height, field_width = bank.shape[1:]
+    bank.flush()
+    del bank
+
+    meta = {
+        'kind': kind,
+        'count': count,
+        'height': height,
+        'width': width,
+        'scale': scale,
+        'margin': margin,
+        'max_sources': max_sources,
+        'intensity_range': list(intensity_range),
+        'radius_range': list(radius_range),
+        'seed': seed,
+    }
+    with open(meta_path, 'w') as f:
+        json.dump(meta, f, indent=2)
+    print(f"已生成 {count} 个{kind}场: {data_path} ({field_width}x{field_height}, scale={scale})")
+    return data_path
+
+
+class FieldBank:
+    """
+    预计算的光照/阴影场库，按需随机取出一个场并做随机裁剪、翻转和增益
+    """
+
+    def __init__(self, path):
+        data_path, meta_path = bank_paths(path)
+        with open(meta_path) as f:
+            self.meta = json.load(f)
+        self.kind = self.meta['kind']
+        self.scale = self.meta['scale']
+        # 以只读内存映射方式打开，多个进程共享同一份页缓存
+        self.fields = np.load(data_path, mmap_mode='r')
+
+    def __len__(self):
+        return len(self.fields)
+
+    def sample(self, height, width, rng=random, gain_range=(0.8, 1.2), upsample=True):
+        """
+        随机取出一个场，随机偏移裁剪、随机翻转并乘以随机增益，插值到 (height, width)
+
+        对阴影场，增益作用在暗化量上：1 - gain * (1 - field)。
+
+        :param rng: 随机数生成器（random 模块或 random.Random 实例）
+        :param upsample: 为False时返回裁剪后的粗网格场，由调用方自行插值
+        :return: (height, width) 的 float32 场
+        """
+        entry = self.fields[rng.randrange(len(self.fields))]
+        field_height, field_width = entry.shape
+        crop_height = min(int(np.ceil(height / self.scale)), field_height)
+        crop_width = min(int(np.ceil(width / self.scale)), field_width)
+        y0 = rng.randint(0, field_height - crop_height)
+        x0 = rng.randint(0, field_width - crop_width)
+        crop = np.array(entry[y0:y0 + crop_height, x0:x0 + crop_width], dtype=np.float32)
+
+        if rng.random() < 0.5:
+            crop = crop[:, ::-1]
+        if rng.random() < 0.5:
+            crop = crop[::-1, :]
+        crop = np.ascontiguousarray(crop)
+
+        gain = np.float32(rng.uniform(*gain_range))
+        if self.kind == 'light':
+            crop *= gain
+        else:
+            crop = np.float32(1) - gain * (np.float32(1) - crop)
+            np.clip(crop, 0, 1, out=crop)
+        if not upsample:
+            return crop
+        return cv2.resize(crop, (width, height), interpolation=cv2.INTER_LINEAR)
+
+
+def open_bank(path, kind):
+    """
+    打开场库并检查类型
+
+    :param kind: 期望的场类型（'light' 或 'shadow'）
+    """
+    field_bank = FieldBank(path)
+    if field_bank.kind != kind:
+        raise ValueError(f"场库类型为 {field_bank.kind}，这里需要 {kind} 场库: {path}")
+    return field_bank
+
+
+def main():
+    parser = argparse.ArgumentParser(description='预生成光照场/阴影场库')
+    parser.add_argument('--output', type=str, default="gen_common/light_bank.npy", help='场库输出路径（.npy）')
+    parser.add_argument('--kind', type=str, default='light', choices=['light', 'shadow'], help='场类型')
+    parser.add_argument('--count', type=int, default=300, help='场的数量')
+    parser.add_argument('--width', type=int, default=5472, help='目标图像宽度')
+    parser.add_argument('--height', type=int, default=3648, help='目标图像高度')
+    parser.add_argument('--scale', type=int, default=8, help='粗网格的缩小倍数')
+    parser.add_argument('--margin', type=float, default=1.25, help='画布相对目标图像的放大倍数，用于随机偏移')
+    parser.add_argument('--max_sources', type=int, default=10, help='每个场中最大光源/阴影数量')
+    parser.add_argument('--intensity', type=float, nargs=2, default=None, help='强度范围（光照默认10 20，阴影默认0.75 0.95）')
+    parser.add_argument('--radius', type=float, nargs=2, default=[500, 1500], help='半径范围')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子')
+
+    args = parser.parse_args()
+
+    build_bank(args.output, args.kind, args.count, args.height, args.width, args.scale, args.margin,
+               args.max_sources, args.intensity, tuple(args.radius), args.seed)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import cv2
+import numpy as np
+
+from gen_common.blend_background import BLUR_KSIZE, resized_background
+from gen_common.gray_mask import threshold_lut, gray_mask_fill, keep_masked
+from gen_common.scaled_assets import scaled_gaussian
+from gen_common.strips import run_strips
+
+# libpng 把 RGB 转为灰度时使用的定点系数（0.299/0.587 截断到 1/32768，蓝色取余数），结果截断取整
+_PNG_GRAY = np.array([[3737, 19234, 9797, 0]], np.float64) / 32768
+# 偏移 -0.5 + 1/65536 使 transform 的四舍五入等价于截断；系数和像素值都能被 float 精确表示
+_PNG_GRAY[0, 3] = -0.5 + 1 / 65536
+
+
+def png_gray(image):
+    """
+    把内存中的 BGR 图像转为灰度，结果与先保存为 PNG 再用 cv2.imread(..., IMREAD_GRAYSCALE) 读取完全相同
+
+    cv2.cvtColor 的系数和取整方式与 libpng 不同，约一半像素会差1，因此这里按 libpng 的定点系数计算。
+    这一等价关系依赖 OpenCV 所带的 libpng（由它的 png_set_rgb_to_gray 完成 PNG 的灰度读取），
+    已在 OpenCV 5.0.0 上对全部 2^24 种颜色逐一核对，tests/test_filter_blend.py 对当前环境做回归检查。
+    单通道图像原样返回。
+    """
+    if image.ndim == 2:
+        return image
+    return cv2.transform(image, _PNG_GRAY)
+
+
+def filter_and_blend(image, background, lut, band_rows=0, blur=(BLUR_KSIZE, 0)):
+    """
+    在内存中依次完成 filter.py 和 blend_with_background.py 的处理：阈值、孔洞填充、保留灰度、
+    纯黑部分用背景填充、高斯模糊，结果与分两步经 PNG 文件处理完全一致
+
+    :param image: 合成图像（BGR 或灰度）
+    :param background: 与图像同样大小的灰度背景，不会被修改
+    :param lut: threshold_lut 得到的阈值查找表
+    :param band_rows: 大于0时逐像素运算和模糊按水平条带处理，孔洞填充仍在整幅掩模上进行
+    :param blur: (核大小, sigma)，缩放生成时由 scaled_gaussian 得到
+    :return: 处理后的灰度图像
+    """
+    gray = png_gray(image)
+    filtered = keep_masked(gray, gray_mask_fill(gray, lut, band_rows), band_rows)
+
+    # 过滤结果的纯黑色部分（像素值为0）替换为背景，直接写回过滤结果
+    np.copyto(filtered, background, where=filtered == 0)
+
+    ksize, sigma = blur
+    if band_rows > 0:
+        # 每条带上下各多取核半径行做模糊，只写回中间部分
+        return run_strips(lambda y0, y1: cv2.GaussianBlur(filtered[y0:y1], (ksize, ksize), sigma),
+                          filtered.shape[0], np.empty_like(filtered), band_rows, halo=ksize // 2)
+    return cv2.GaussianBlur(filtered, (ksize, ksize), sigma)
+
+
+class FilterBlend:
+    """
+    合成后直接在内存中过滤并与背景拼接的处理阶段，供合成脚本在保存前调用
+
+    只保存阈值、查找表和背景路径，可以随参数传给子进程；背景在各进程第一次使用时解码并按尺寸缓存。
+    """
+
+    def __init__(self, background_image_path, lower_threshold, upper_threshold, band_rows=0, scale=1):
+        self.background_image_path = background_image_path
+        self.lut = threshold_lut(lower_threshold, upper_threshold)
+        self.band_rows = band_rows
+        self.blur = scaled_gaussian(BLUR_KSIZE, scale)
+
+    def __call__(self, image):
+        """
+        :param image: 合成图像（BGR 或灰度）
+        :return: 处理后的灰度图像，背景读取失败时返回None
+        """
+        background = resized_background(self.background_image_path, image.shape[1], image.shape[0])
+        if background is None:
+            print(f"无法读取背景图片: {self.background_image_path}")
+            return None
+        return filter_and_blend(image, background, self.lut, self.band_rows, self.blur)
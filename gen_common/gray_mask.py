@@ -0,0 +1,60 @@
+import cv2
+import numpy as np
+
+from gen_common.strips import map_strips
+
+# 填充掩模时标记与图像边缘连通的背景所用的灰度值（0/255 以外的任意值）
+_OUTSIDE = 128
+
+
+def threshold_lut(lower_threshold, upper_threshold):
+    """
+    灰度阈值的256级查找表：灰度 >= 上限或 <= 下限的像素映射为255，其余为0
+
+    灰度为0的像素即使满足阈值也映射为0，与原先“保留阈值范围内灰度、再按非零像素找轮廓”的结果一致。
+    """
+    levels = np.arange(256)
+    keep = ((levels >= upper_threshold) | (levels <= lower_threshold)) & (levels != 0)
+    return np.where(keep, 255, 0).astype(np.uint8)
+
+
+def fill_holes(mask):
+    """
+    填充二值掩模中所有外轮廓的内部，结果与 findContours(RETR_EXTERNAL) + drawContours(FILLED) 相同
+
+    前景按8连通、背景按4连通：从图像外一圈向内做4连通漫水填充，填不到的背景就是被前景包围的孔洞，
+    孔洞连同前景一起置为255。不再提取和光栅化轮廓多边形。
+
+    :param mask: uint8 二值掩模（0/255）
+    :return: 新的 uint8 掩模（0/255）
+    """
+    padded = cv2.copyMakeBorder(mask, 1, 1, 1, 1, cv2.BORDER_CONSTANT, value=0)
+    cv2.floodFill(padded, None, (0, 0), _OUTSIDE, flags=4)
+    return cv2.compare(padded[1:-1, 1:-1], _OUTSIDE, cv2.CMP_NE)
+
+
+def gray_mask_fill(image, lut, band_rows=0):
+    """
+    查表得到阈值掩模、填充孔洞，返回填充区域的二值掩模（0/255）
+
+    :param image: 灰度图像
+    :param lut: threshold_lut 得到的查找表
+    :param band_rows: 大于0时查表按水平条带处理，孔洞填充仍在整幅掩模上进行
+    """
+    if band_rows > 0:
+        mask = map_strips(lambda rows: cv2.LUT(rows, lut), image, band_rows=band_rows)
+    else:
+        mask = cv2.LUT(image, lut)
+    return fill_holes(mask)
+
+
+def keep_masked(image, filled, band_rows=0):
+    """
+    只保留掩模为255处的原始灰度，其余置0，结果原地写回掩模
+
+    掩模只有0和255两种值，按位与即等于 np.where(filled == 255, image, 0)。
+    """
+    if band_rows > 0:
+        return map_strips(lambda rows, filled_rows: cv2.bitwise_and(rows, filled_rows),
+                          image, filled, out=filled, band_rows=band_rows)
+    return cv2.bitwise_and(image, filled, dst=filled)
@@ -0,0 +1,185 @@
+import random
+
+import cv2
+import numpy as np
+
+
+def sample_lights(width, height, max_lights=10, intensity_range=(10, 20), radius_range=(500, 1500)):
+    """
+    随机生成光源参数，随机数的抽取顺序与原先逐个光源生成时一致
+
+    :return: [(中心x, 中心y, 强度, 半径), ...]
+    """
+    # 随机生成光源数量
+    num_lights = random.randint(1, max_lights)
+    lights = []
+    for _ in range(num_lights):
+        light_center = (random.randint(0, width), random.randint(0, height))  # 光源中心
+        light_intensity = random.uniform(*intensity_range)  # 光源强度
+        light_radius = random.uniform(*radius_range)  # 光源半径
+        lights.append((light_center[0], light_center[1], light_intensity, light_radius))
+    return lights
+
+
+def sample_shadows(width, height, max_shadows=10, intensity_range=(0.75, 0.95), radius_range=(500, 1500)):
+    """
+    随机生成阴影参数，随机数的抽取顺序与原先逐个阴影生成时一致
+
+    :return: [(中心x, 中心y, 强度, 半径), ...]，强度为阴影中心的亮度系数
+    """
+    # 随机生成阴影数量
+    num_shadows = random.randint(1, max_shadows)
+    shadows = []
+    for _ in range(num_shadows):
+        shadow_center = (random.randint(0, width), random.randint(0, height))  # 阴影中心
+        shadow_intensity = random.uniform(*intensity_range)  # 阴影强度
+        shadow_radius = random.uniform(*radius_range)  # 阴影半径
+        shadows.append((shadow_center[0], shadow_center[1], shadow_intensity, shadow_radius))
+    return shadows
+
+
+def _field_shape(height, width, scale):
+    """按缩放倍数计算粗网格的大小"""
+    if scale <= 1:
+        return height, width
+    return max(int(np.ceil(height / scale)), 2), max(int(np.ceil(width / scale)), 2)
+
+
+def _grid(length, coarse_length):
+    """粗网格各采样点在原图中的坐标，与 cv2.resize 线性插值的像素中心对齐"""
+    ratio = length / coarse_length
+    return (np.arange(coarse_length, dtype=np.float32) + np.float32(0.5)) * np.float32(ratio) - np.float32(0.5)
+
+
+def _distance_window(xs, ys, cx, cy, radius, buffer):
+    """
+    计算半径范围内各采样点到中心的距离
+
+    光源/阴影在半径之外不起作用，因此只计算覆盖半径的窗口。
+
+    :return: (窗口在场中的切片, 写入 buffer 的距离窗口)，窗口为空时返回 (None, None)
+    """
+    x0, x1 = np.searchsorted(xs, [cx - radius, cx + radius], side='left')
+    y0, y1 = np.searchsorted(ys, [cy - radius, cy + radius], side='left')
+    if x0 >= x1 or y0 >= y1:
+        return None, None
+    dx2 = np.square(xs[x0:x1] - np.float32(cx))
+    dy2 = np.square(ys[y0:y1] - np.float32(cy))
+    window = buffer[:y1 - y0, :x1 - x0]
+    np.add(dy2[:, None], dx2[None, :], out=window)
+    np.sqrt(window, out=window)
+    return (slice(y0, y1), slice(x0, x1)), window
+
+
+def _upsample(field, height, width):
+    """将粗网格上的场双线性插值到原图大小"""
+    if field.shape == (height, width):
+        return field
+    return cv2.resize(field, (width, height), interpolation=cv2.INTER_LINEAR)
+
+
+def upsample_rows(field, height, width, y0, y1):
+    """
+    只计算粗网格场双线性插值到 (height, width) 后第 y0 到 y1 行的结果，用于按条带处理
+
+    竖直方向按 cv2.resize 线性插值的坐标和边界规则在粗网格行之间插值，水平方向再用 cv2.resize 插值，
+    与整幅插值的结果只有浮点舍入上的差别。
+
+    :return: (y1 - y0, width) 的 float32 场
+    """
+    field_height = field.shape[0]
+    fy = (np.arange(y0, y1, dtype=np.float64) + 0.5) * (field_height / height) - 0.5
+    sy = np.floor(fy).astype(np.int64)
+    weight = (fy - sy).astype(np.float32)
+    weight[sy < 0] = 0
+    sy[sy < 0] = 0
+    last = sy >= field_height - 1
+    weight[last] = 0
+    sy[last] = field_height - 1
+    r0, r1 = sy[0], min(sy[-1] + 1, field_height - 1)
+    # 只取用到的粗网格行
+    coarse = field[r0:r1 + 1]
+    upper = coarse[sy - r0]
+    lower = coarse[np.minimum(sy + 1, field_height - 1) - r0]
+    rows = upper + (lower - upper) * weight[:, None]
+    if rows.shape[1] == width:
+        return rows
+    return cv2.resize(rows, (width, y1 - y0), interpolation=cv2.INTER_LINEAR)
+
+
+def _add_lights(field, xs, ys, lights, buffer):
+    """在场上原地累加各光源的亮度 intensity * (1 - d / radius)"""
+    for cx, cy, intensity, radius in lights:
+        region, window = _distance_window(xs, ys, cx, cy, radius, buffer)
+        if region is None:
+            continue
+        # window = max(intensity - d * intensity / radius, 0)
+        window *= np.float32(-intensity / radius)
+        window += np.float32(intensity)
+        np.maximum(window, 0, out=window)
+        field[region] += window
+
+
+def _multiply_shadows(field, xs, ys, shadows, buffer):
+    """在场上原地乘以各阴影的系数 intensity + (1 - intensity) * min(d / radius, 1)"""
+    for cx, cy, intensity, radius in shadows:
+        region, window = _distance_window(xs, ys, cx, cy, radius, buffer)
+        if region is None:
+            continue
+        # window = intensity + (1 - intensity) * min(d / radius, 1)
+        window *= np.float32(1 / radius)
+        np.minimum(window, 1, out=window)
+        window *= np.float32(1 - intensity)
+        window += np.float32(intensity)
+        field[region] *= window
+
+
+def light_field(height, width, lights, scale=1, upsample=True):
+    """
+    计算多个光源叠加后的光照场（float32）
+
+    每个光源的亮度为 intensity * (1 - d / radius)，在半径之外为0。
+    坐标网格只生成一次；每个光源只在其半径覆盖的窗口内计算，并在预分配的缓冲区上原地累加。
+
+    :param lights: [(中心x, 中心y, 强度, 半径), ...]
+    :param scale: 大于1时先在缩小 scale 倍的粗网格上计算，再双线性插值到原图大小
+    :param upsample: 为False时直接返回粗网格上的场
+    :return: (height, width) 的 float32 光照场
+    """
+    field_height, field_width = _field_shape(height, width, scale)
+    xs = _grid(width, field_width)
+    ys = _grid(height, field_height)
+    field = np.zeros((field_height, field_width), dtype=np.float32)
+    buffer = np.empty((field_height, field_width), dtype=np.float32)
+    _add_lights(field, xs, ys, lights, buffer)
+    return _upsample(field, height, width) if upsample else field
+
+
+def shadow_field(height, width, shadows, scale=1, upsample=True):
+    """
+    计算多个阴影相乘后的亮度系数场（float32）
+
+    每个阴影的系数为 intensity + (1 - intensity) * min(d / radius, 1)，中心最暗，半径之外为1。
+
+    :param shadows: [(中心x, 中心y, 强度, 半径), ...]
+    :param scale: 大于1时先在缩小 scale 倍的粗网格上计算，再双线性插值到原图大小
+    :param upsample: 为False时直接返回粗网格上的场
+    :return: (height, width) 的 float32 阴影系数场
+    """
+    field_height, field_width = _field_shape(height, width, scale)
+    xs = _grid(width, field_width)
+    ys = _grid(height, field_height)
+    field = np.ones((field_height, field_width), dtype=np.float32)
+    buffer = np.empty((field_height, field_width), dtype=np.float32)
+    _multiply_shadows(field, xs, ys, shadows, buffer)
+    return _upsample(field, height, width) if upsample else field
+
+
+def field_error(reference, approx):
+    """
+    比较近似场与全分辨率场的误差
+
+    :return: (最大绝对误差, 平均绝对误差)
+    """
+    diff = np.abs(reference.astype(np.float32) - approx.astype(np.float32))
+    return float(diff.max()), float(diff.mean())
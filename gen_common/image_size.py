@@ -0,0 +1,89 @@
+import struct
+
+import cv2
+
+# JPEG 中带图像尺寸的帧起始标记（SOF0～SOF15，不含 DHT/JPG/DAC）
+_JPEG_SOF = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def _png_size(f):
+    header = f.read(24)
+    if len(header) < 24 or header[:8] != b'\x89PNG\r\n\x1a\n' or header[12:16] != b'IHDR':
+        return None
+    width, height = struct.unpack('>II', header[16:24])
+    return width, height
+
+
+def _bmp_size(f):
+    header = f.read(26)
+    if len(header) < 26 or header[:2] != b'BM':
+        return None
+    width, height = struct.unpack('<ii', header[18:26])
+    # 高度为负表示自上而下存储
+    return width, abs(height)
+
+
+def _jpeg_size(f):
+    if f.read(2) != b'\xff\xd8':
+        return None
+    while True:
+        byte = f.read(1)
+        if not byte:
+            return None
+        if byte != b'\xff':
+            continue
+        marker = f.read(1)
+        while marker == b'\xff':
+            marker = f.read(1)
+        if not marker:
+            return None
+        marker = marker[0]
+        # 没有长度字段的标记
+        if marker in (0x01, 0xD8) or 0xD0 <= marker <= 0xD7:
+            continue
+        if marker == 0xD9:
+            return None
+        length_bytes = f.read(2)
+        if len(length_bytes) < 2:
+            return None
+        length = struct.unpack('>H', length_bytes)[0]
+        if marker in _JPEG_SOF:
+            data = f.read(5)
+            if len(data) < 5:
+                return None
+            height, width = struct.unpack('>HH', data[1:5])
+            return width, height
+        f.seek(length - 2, 1)
+
+
+_READERS = {
+    '.png': _png_size,
+    '.bmp': _bmp_size,
+    '.jpg': _jpeg_size,
+    '.jpeg': _jpeg_size,
+}
+
+
+def read_image_size(path, decode_fallback=True):
+    """
+    只读取文件头得到图像的 (宽, 高)，不解码像素
+
+    支持 PNG、BMP 和 JPEG；其他格式或文件头无法识别时，decode_fallback 为True则完整解码一次，否则返回None。
+
+    :return: (宽, 高)，读取失败时返回None
+    """
+    reader = _READERS.get(path[path.rfind('.'):].lower())
+    if reader is not None:
+        try:
+            with open(path, 'rb') as f:
+                size = reader(f)
+        except OSError:
+            return None
+        if size is not None:
+            return size
+    if not decode_fallback:
+        return None
+    image = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+    if image is None:
+        return None
+    return image.shape[1], image.shape[0]
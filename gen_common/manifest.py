@@ -0,0 +1,118 @@
+import hashlib
+import json
+import os
+
+# 原地处理时记录已处理内容的清单文件名，放在输出文件夹中
+MANIFEST_NAME = '.photometric_manifest.jsonl'
+TEMP_SUFFIX = '.tmp'
+
+
+def content_hash(data):
+    """文件内容的哈希，用于识别已处理的图像（与文件名无关）"""
+    return hashlib.sha1(data).hexdigest()
+
+
+def params_key(params):
+    """将处理参数序列化为稳定的字符串，参数不同时视为不同的处理"""
+    return json.dumps(params, sort_keys=True, separators=(',', ':'))
+
+
+def temp_path(path):
+    """输出文件的临时路径，扩展名不是图像扩展名，不会被当作输入图像"""
+    return path + TEMP_SUFFIX
+
+
+def write_temp(path, data):
+    """
+    将编码后的图像写入临时文件并落盘，之后由 Manifest.commit 原子地重命名为正式文件
+
+    :return: 临时文件路径
+    """
+    tmp = temp_path(path)
+    with open(tmp, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    return tmp
+
+
+class Manifest:
+    """
+    原地处理的清单，每行一条记录：源文件内容哈希、处理参数、输出文件名和输出内容哈希
+
+    提交顺序为：临时文件落盘 -> 追加清单记录 -> 重命名为正式文件。
+    中断后重新运行时，清单中已有的输出会被补完重命名，其余临时文件被删除，因此不会留下写了一半的图像。
+    """
+
+    def __init__(self, folder, name=MANIFEST_NAME):
+        self.folder = folder
+        self.path = os.path.join(folder, name)
+        self.done = set()      # {(源哈希, 参数), ...}
+        self.outputs = {}      # {输出哈希: (输出文件名, 参数)}
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # 中断时最后一行可能不完整
+                    continue
+                self.done.add((record['source_hash'], record['params']))
+                self.outputs[record['output_hash']] = (record['output'], record['params'])
+
+    def is_done(self, source_hash, key):
+        """
+        源内容已经用相同参数处理过，或者它本身就是相同参数处理的输出
+
+        同一文件夹中依次进行的不同处理（如先加阴影再加光照）共用清单，
+        其他处理的输出仍是本次处理的输入，不能跳过。
+        """
+        return (source_hash, key) in self.done or self.outputs.get(source_hash, (None, None))[1] == key
+
+    def recover(self, expected_outputs):
+        """
+        处理本次处理的输出在上次中断时留下的临时文件：已记录在清单中的补完重命名，否则删除
+
+        只检查 expected_outputs 对应的临时文件；其他 .tmp 文件（用户文件、其他工具的临时文件、
+        同一文件夹中另一个处理正在写的输出）一律不动。
+
+        :param expected_outputs: 本次处理会写出的输出文件名集合
+        :return: (补完数量, 删除数量)
+        """
+        recovered = 0
+        removed = 0
+        for name in os.listdir(self.folder):
+            if not name.endswith(TEMP_SUFFIX) or name[:-len(TEMP_SUFFIX)] not in expected_outputs:
+                continue
+            tmp = os.path.join(self.folder, name)
+            with open(tmp, 'rb') as f:
+                digest = content_hash(f.read())
+            if self.outputs.get(digest, (None, None))[0] == name[:-len(TEMP_SUFFIX)]:
+                os.replace(tmp, tmp[:-len(TEMP_SUFFIX)])
+                recovered += 1
+            else:
+                os.remove(tmp)
+                removed += 1
+        return recovered, removed
+
+    def commit(self, source, source_hash, key, output, output_hash):
+        """追加一条记录并落盘，再将临时文件重命名为正式输出"""
+        record = {
+            'source': source,
+            'source_hash': source_hash,
+            'params': key,
+            'output': output,
+            'output_hash': output_hash,
+        }
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(record, separators=(',', ':')) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self.done.add((source_hash, key))
+        self.outputs[output_hash] = (output, key)
+        output_path = os.path.join(self.folder, output)
+        os.replace(temp_path(output_path), output_path)
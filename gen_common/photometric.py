@@ -0,0 +1,504 @@
+import argparse
+import copy
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from gen_common.illumination import (sample_lights, sample_shadows, light_field, shadow_field, upsample_rows,
+                                     _field_shape, _grid, _upsample, _add_lights, _multiply_shadows)
+from gen_common.field_bank import open_bank
+from gen_common.strips import STRIP_ROWS, run_strips
+from gen_common.manifest import Manifest, content_hash, params_key, write_temp
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')
+
+# 低内存模式的定点格式：光照场为 Q8.8（值 * 256），阴影系数为 Q0.16（值 * 65535），均存为 uint16
+LIGHT_ONE = 256
+SHADOW_ONE = 65535
+# 低内存模式下全分辨率计算场时，每次计算的行数
+BAND_ROWS = 256
+
+
+def sample_spec(width, height, max_lights=10, max_shadows=10, light_intensity=(10, 20),
+                shadow_intensity=(0.75, 0.95), radius_range=(500, 1500)):
+    """
+    随机生成一组光照/阴影参数
+
+    先抽取光源再抽取阴影；某一类的最大数量为0时不抽取，随机数的抽取顺序与单独的光照或阴影脚本一致。
+
+    :return: {'lights': [(中心x, 中心y, 强度, 半径), ...], 'shadows': [...]}
+    """
+    lights = sample_lights(width, height, max_lights, light_intensity, radius_range) if max_lights > 0 else []
+    shadows = sample_shadows(width, height, max_shadows, shadow_intensity, radius_range) if max_shadows > 0 else []
+    return {'lights': lights, 'shadows': shadows}
+
+
+def photometric_fields(height, width, spec, scale=1, upsample=True):
+    """
+    计算加性光照场和乘性阴影场
+
+    两类场共用同一套坐标网格和距离缓冲区；在粗网格上计算时，两个场合并为双通道图像只插值一次。
+
+    :param spec: sample_spec 返回的参数，{'lights': [...], 'shadows': [...]}
+    :param scale: 大于1时先在缩小 scale 倍的粗网格上计算，再双线性插值到原图大小
+    :param upsample: 为False时直接返回粗网格上的场
+    :return: (光照场, 阴影系数场)，某一类为空时对应位置为None
+    """
+    lights = spec.get('lights') or []
+    shadows = spec.get('shadows') or []
+    field_height, field_width = _field_shape(height, width, scale)
+    xs = _grid(width, field_width)
+    ys = _grid(height, field_height)
+    buffer = np.empty((field_height, field_width), dtype=np.float32)
+
+    light = None
+    shadow = None
+    if lights:
+        light = np.zeros((field_height, field_width), dtype=np.float32)
+        _add_lights(light, xs, ys, lights, buffer)
+    if shadows:
+        shadow = np.ones((field_height, field_width), dtype=np.float32)
+        _multiply_shadows(shadow, xs, ys, shadows, buffer)
+
+    if not upsample or (field_height, field_width) == (height, width):
+        return light, shadow
+    if light is not None and shadow is not None:
+        fields = cv2.resize(cv2.merge([light, shadow]), (width, height), interpolation=cv2.INTER_LINEAR)
+        return fields[:, :, 0], fields[:, :, 1]
+    return (_upsample(light, height, width) if light is not None else None,
+            _upsample(shadow, height, width) if shadow is not None else None)
+
+
+def apply_fields(image, light=None, shadow=None):
+    """
+    在一次遍历中将光照场和阴影场作用到图像上：(image + floor(light)) 截断到255后乘以阴影系数
+
+    只有光照或只有阴影时，结果与原 change_light.py（cv2.add）和 cast_shadow.py（相乘后截断）一致。
+
+    :param image: uint8 灰度图像
+    :param light: 加性光照场（float32），None表示不加光照
+    :param shadow: 乘性阴影系数场（float32），None表示不加阴影
+    :return: uint8 图像
+    """
+    work = np.empty(image.shape, dtype=np.float32)
+    if light is not None:
+        # 光照场先取整再叠加，与 light_mask.astype(np.uint8) 后 cv2.add 的结果一致
+        np.floor(light, out=work)
+        work += image
+        np.minimum(work, 255, out=work)
+    else:
+        work[...] = image
+    if shadow is not None:
+        work *= shadow
+    return work.astype(np.uint8)
+
+
+def render_image(image, max_lights=10, max_shadows=10, light_intensity=(10, 20), shadow_intensity=(0.75, 0.95),
+                 field_scale=1, light_bank=None, shadow_bank=None, low_memory=False, band_rows=0):
+    """
+    对已读入的灰度图像随机生成光照/阴影并应用
+
+    参数见 simulate_image
+    :return: uint8 图像
+    """
+    height, width = image.shape
+
+    # 场库已给出的那一类不再抽取参数
+    spec = sample_spec(width, height,
+                       0 if light_bank is not None else max_lights,
+                       0 if shadow_bank is not None else max_shadows,
+                       light_intensity, shadow_intensity)
+    if low_memory:
+        return render_fixed(image, spec, field_scale,
+                            light_bank if max_lights > 0 else None,
+                            shadow_bank if max_shadows > 0 else None,
+                            band_rows or BAND_ROWS)
+    if band_rows > 0:
+        return render_strips(image, spec, field_scale,
+                             light_bank if max_lights > 0 else None,
+                             shadow_bank if max_shadows > 0 else None,
+                             band_rows)
+
+    light, shadow = photometric_fields(height, width, spec, scale=field_scale)
+    if light_bank is not None and max_lights > 0:
+        light = light_bank.sample(height, width)
+    if shadow_bank is not None and max_shadows > 0:
+        shadow = shadow_bank.sample(height, width)
+    return apply_fields(image, light, shadow)
+
+
+def render_strips(image, spec, scale=1, light_bank=None, shadow_bank=None, band_rows=STRIP_ROWS):
+    """
+    按水平条带逐段计算光照/阴影场并作用到图像上，结果写入一个输出缓冲区
+
+    scale 大于1或使用场库时，先得到整幅的粗网格场（很小），每条带只插值出所需的行；
+    scale 为1时每条带直接在全分辨率上计算。float32 临时数组只有一条带的大小，峰值内存由 band_rows 决定。
+    scale 为1时结果与整幅计算完全一致，粗网格时只有插值的浮点舍入差别。
+
+    :param spec: sample_spec 返回的参数
+    :param light_bank: 可选的光照 FieldBank，给定时代替 spec 中的光源
+    :param shadow_bank: 可选的阴影 FieldBank，给定时代替 spec 中的阴影
+    :param band_rows: 每条带的行数
+    :return: uint8 图像
+    """
+    height, width = image.shape
+    lights = spec.get('lights') or []
+    shadows = spec.get('shadows') or []
+
+    # 粗网格场整幅计算一次
+    coarse_light, coarse_shadow = photometric_fields(height, width, spec, scale=scale, upsample=False) \
+        if scale > 1 else (None, None)
+    if light_bank is not None:
+        coarse_light = light_bank.sample(height, width, upsample=False)
+    if shadow_bank is not None:
+        coarse_shadow = shadow_bank.sample(height, width, upsample=False)
+
+    xs = _grid(width, width)
+    ys = _grid(height, height)
+    buffer = np.empty((band_rows, width), dtype=np.float32)
+
+    def band(y0, y1):
+        light = None
+        shadow = None
+        if coarse_light is not None:
+            light = upsample_rows(coarse_light, height, width, y0, y1)
+        elif lights:
+            light = np.zeros((y1 - y0, width), dtype=np.float32)
+            _add_lights(light, xs, ys[y0:y1], lights, buffer)
+        if coarse_shadow is not None:
+            shadow = upsample_rows(coarse_shadow, height, width, y0, y1)
+        elif shadows:
+            shadow = np.ones((y1 - y0, width), dtype=np.float32)
+            _multiply_shadows(shadow, xs, ys[y0:y1], shadows, buffer)
+        return apply_fields(image[y0:y1], light, shadow)
+
+    return run_strips(band, height, np.empty_like(image), band_rows)
+
+
+def _to_fixed(field, one):
+    """将 float32 场转换为 uint16 定点数（截断到 [0, 65535]）"""
+    fixed = field * np.float32(one)
+    np.clip(fixed, 0, 65535, out=fixed)
+    return fixed.astype(np.uint16)
+
+
+def fixed_point_field(height, width, sources, kind='light', scale=1, band_rows=BAND_ROWS):
+    """
+    计算低内存模式下的 uint16 定点场：光照场为 Q8.8，阴影系数场为 Q0.16
+
+    scale 大于1时在粗网格上计算 float32 场，转为定点后再用 uint16 插值到原图大小；
+    scale 为1时按 band_rows 行一段计算，float32 临时数组只有一段的大小。
+
+    :param sources: [(中心x, 中心y, 强度, 半径), ...]
+    :param kind: 'light' 或 'shadow'
+    :return: (height, width) 的 uint16 定点场
+    """
+    one = LIGHT_ONE if kind == 'light' else SHADOW_ONE
+    if scale > 1:
+        if kind == 'light':
+            coarse = light_field(height, width, sources, scale=scale, upsample=False)
+        else:
+            coarse = shadow_field(height, width, sources, scale=scale, upsample=False)
+        return _upsample(_to_fixed(coarse, one), height, width)
+
+    xs = _grid(width, width)
+    ys = _grid(height, height)
+    rows_buffer = np.empty((band_rows, width), dtype=np.float32)
+    buffer = np.empty((band_rows, width), dtype=np.float32)
+
+    def band(y0, y1):
+        rows = rows_buffer[:y1 - y0]
+        if kind == 'light':
+            rows.fill(0)
+            _add_lights(rows, xs, ys[y0:y1], sources, buffer)
+        else:
+            rows.fill(1)
+            _multiply_shadows(rows, xs, ys[y0:y1], sources, buffer)
+        return _to_fixed(rows, one)
+
+    return run_strips(band, height, np.empty((height, width), dtype=np.uint16), band_rows)
+
+
+def render_fixed(image, spec, scale=1, light_bank=None, shadow_bank=None, band_rows=BAND_ROWS):
+    """
+    低内存模式：依次生成 uint16 定点光照场和阴影场，并用OpenCV的饱和运算作用到图像上
+
+    同一时刻只保留一个定点场，阴影在结果上原地相乘，峰值内存约为图像的4倍，不产生 float 全图临时数组。
+    光照场右移8位取整后与图像饱和相加；阴影系数通过 cv2.multiply 的 scale 参数换算，结果四舍五入
+    （float 路径为截断），因此与 apply_fields 相差1～2个灰度。
+
+    :param spec: sample_spec 返回的参数
+    :param light_bank: 可选的光照 FieldBank，给定时代替 spec 中的光源
+    :param shadow_bank: 可选的阴影 FieldBank，给定时代替 spec 中的阴影
+    :param band_rows: 全分辨率计算定点场时每段的行数
+    :return: uint8 图像
+    """
+    height, width = image.shape
+    result = image
+    if light_bank is not None:
+        # 场库的粗网格场先转为定点数再插值
+        light = _upsample(_to_fixed(light_bank.sample(height, width, upsample=False), LIGHT_ONE), height, width)
+    elif spec.get('lights'):
+        light = fixed_point_field(height, width, spec['lights'], 'light', scale, band_rows)
+    else:
+        light = None
+    if light is not None:
+        np.right_shift(light, 8, out=light)
+        result = cv2.add(image, light, dtype=cv2.CV_8U)
+        del light
+
+    if shadow_bank is not None:
+        shadow = _upsample(_to_fixed(shadow_bank.sample(height, width, upsample=False), SHADOW_ONE), height, width)
+    elif spec.get('shadows'):
+        shadow = fixed_point_field(height, width, spec['shadows'], 'shadow', scale, band_rows)
+    else:
+        shadow = None
+    if shadow is not None:
+        if result is image:
+            result = cv2.multiply(image, shadow, scale=1 / SHADOW_ONE, dtype=cv2.CV_8U)
+        else:
+            cv2.multiply(result, shadow, dst=result, scale=1 / SHADOW_ONE, dtype=cv2.CV_8U)
+    return result
+
+
+def simulate_image(image_path, output_path, max_lights=10, max_shadows=10, light_intensity=(10, 20),
+                   shadow_intensity=(0.75, 0.95), field_scale=1, light_bank=None, shadow_bank=None, verbose=True,
+                   low_memory=False, band_rows=0):
+    """
+    在灰度图上同时模拟多个光源和阴影，一次读取、一次计算、一次写出
+
+    :param image_path: 输入灰度图片的路径
+    :param output_path: 输出图片的保存路径
+    :param max_lights: 最大光源数量，0表示不加光照
+    :param max_shadows: 最大阴影数量，0表示不加阴影
+    :param light_intensity: 光源强度范围
+    :param shadow_intensity: 阴影中心亮度系数范围
+    :param field_scale: 粗网格的缩小倍数，大于1时在粗网格上计算后双线性插值
+    :param light_bank: 可选的光照 FieldBank，给定时从场库取光照场
+    :param shadow_bank: 可选的阴影 FieldBank，给定时从场库取阴影场
+    :param verbose: 是否逐张输出保存信息（读取失败总会输出）
+    :param low_memory: 低内存模式，场以 uint16 定点数保存并用OpenCV饱和运算作用到图像上（与默认模式相差1～2个灰度）
+    :param band_rows: 大于0时按该行数的水平条带逐段处理，峰值内存由条带大小决定
+    :return: 操作是否成功
+    """
+    # 读取灰度图片
+    image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        print(f"无法读取图片: {image_path}")
+        return False
+
+    result = render_image(image, max_lights, max_shadows, light_intensity, shadow_intensity,
+                          field_scale, light_bank, shadow_bank, low_memory, band_rows)
+    cv2.imwrite(output_path, result)
+    if verbose:
+        print(f"光照/阴影处理后的图片已保存到: {output_path}")
+    return True
+
+
+# 每个进程各自的状态（场库和清单快照），由 _init_worker 设置
+_worker_state = {'light': None, 'shadow': None, 'manifest': None}
+
+
+def _init_worker(cv2_threads, light_bank_path, shadow_bank_path, manifest=None):
+    """进程初始化：限制OpenCV线程数，在进程内以内存映射方式打开场库，并保存清单的快照"""
+    if cv2_threads is not None:
+        cv2.setNumThreads(cv2_threads)
+    _worker_state['light'] = open_bank(light_bank_path, 'light') if light_bank_path else None
+    _worker_state['shadow'] = open_bank(shadow_bank_path, 'shadow') if shadow_bank_path else None
+    _worker_state['manifest'] = manifest
+
+
+def file_seed(seed, image_file):
+    """由总种子和文件名得到单张图像的种子，结果与处理顺序和进程数无关"""
+    return f"{seed}/{image_file}"
+
+
+def _process_file(task):
+    """
+    处理单张图像
+
+    key 为None时直接写出；否则按清单判断是否跳过，并把结果写到临时文件，由主进程记录清单后重命名。
+
+    :return: (状态 'done' / 'skipped' / 'failed', 清单记录或None)
+    """
+    input_path, output_path, seed, params, key = task
+    banks = {'light_bank': _worker_state['light'], 'shadow_bank': _worker_state['shadow']}
+    if key is None:
+        random.seed(seed)
+        success = simulate_image(input_path, output_path, verbose=False, **banks, **params)
+        return ('done' if success else 'failed'), None
+
+    # 读取一次文件内容，同时用于计算哈希和解码
+    with open(input_path, 'rb') as f:
+        data = f.read()
+    source_hash = content_hash(data)
+    if _worker_state['manifest'].is_done(source_hash, key):
+        return 'skipped', None
+
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        print(f"无法读取图片: {input_path}")
+        return 'failed', None
+
+    random.seed(seed)
+    result = render_image(image, **banks, **params)
+    success, encoded = cv2.imencode(os.path.splitext(output_path)[1], result)
+    if not success:
+        print(f"无法编码图片: {output_path}")
+        return 'failed', None
+    encoded = encoded.tobytes()
+    write_temp(output_path, encoded)
+    record = (os.path.basename(input_path), source_hash, key, os.path.basename(output_path), content_hash(encoded))
+    return 'done', record
+
+
+def process_folder(input_folder, output_folder, suffix='', max_lights=10, max_shadows=10,
+                   light_intensity=(10, 20), shadow_intensity=(0.75, 0.95), field_scale=1,
+                   light_bank_path=None, shadow_bank_path=None, workers=1, seed=None, cv2_threads=1,
+                   use_manifest=False, low_memory=False, band_rows=0):
+    """
+    处理文件夹中的所有图像，应用光照和阴影模拟，并将结果保存到输出文件夹。
+
+    每张图像使用由总种子和文件名得到的独立种子，因此结果与进程数无关；处理结束后只输出一行汇总。
+
+    使用清单时（用于输入和输出为同一文件夹的原地处理）：
+    已用相同参数处理过的内容、以及本身是相同参数处理的输出的内容都会被跳过（其他处理的输出照常处理）；
+    输出先写临时文件再原子重命名，中断后重新运行即可从断点继续。
+
+    :param input_folder: 输入图像文件夹路径
+    :param output_folder: 输出图像文件夹路径
+    :param suffix: 输出文件名在扩展名前添加的后缀（如 _light、_shadow）
+    :param light_bank_path: 可选的预计算光照场库路径（由 gen_common/field_bank.py 生成）
+    :param shadow_bank_path: 可选的预计算阴影场库路径
+    :param workers: 进程数，1表示在当前进程中依次处理
+    :param seed: 总随机种子，None时随机选取
+    :param cv2_threads: 多进程时每个进程的OpenCV线程数
+    :param use_manifest: 是否在输出文件夹中维护已处理内容的清单
+    :param low_memory: 低内存模式（uint16 定点场）
+    :param band_rows: 大于0时按水平条带逐段处理
+    其余参数见 simulate_image
+    :return: (成功数量, 失败数量)
+    """
+    # 确保输出文件夹存在
+    os.makedirs(output_folder, exist_ok=True)
+
+    params = {
+        'max_lights': max_lights,
+        'max_shadows': max_shadows,
+        'light_intensity': light_intensity,
+        'shadow_intensity': shadow_intensity,
+        'field_scale': field_scale,
+        'low_memory': low_memory,
+        'band_rows': band_rows,
+    }
+
+    # 获取输入文件夹中的所有图像文件
+    image_files = sorted(f for f in os.listdir(input_folder) if f.lower().endswith(IMAGE_EXTENSIONS))
+
+    if not image_files:
+        print(f"在文件夹 {input_folder} 中没有找到图像文件")
+        return 0, 0
+
+    skipped_count = 0
+    if use_manifest and suffix:
+        # 文件名是另一张源图的输出名时，它是以前处理的产物（包括建立清单之前的），不再作为输入
+        derived = {f"{os.path.splitext(f)[0]}{suffix}{os.path.splitext(f)[1]}" for f in image_files}
+        sources = [f for f in image_files if f not in derived]
+        skipped_count += len(image_files) - len(sources)
+        image_files = sources
+
+    output_files = {f: f"{os.path.splitext(f)[0]}{suffix}{os.path.splitext(f)[1]}" for f in image_files}
+
+    manifest = None
+    key = None
+    if use_manifest:
+        manifest = Manifest(output_folder)
+        # 只恢复或清理本次输出的临时文件，其他处理的临时文件不动
+        recovered, removed = manifest.recover(set(output_files.values()))
+        if recovered or removed:
+            print(f"清单恢复: 补完 {recovered} 个中断时已记录的输出, 删除 {removed} 个未完成的临时文件")
+        # 种子和条带行数不计入参数，未指定种子或改变条带大小的重复运行同样会跳过已处理的内容
+        key_params = {name: value for name, value in params.items() if name != 'band_rows'}
+        key = params_key(dict(key_params, suffix=suffix, light_bank=light_bank_path, shadow_bank=shadow_bank_path))
+
+    if seed is None:
+        seed = random.getrandbits(32)
+
+    tasks = []
+    for image_file in image_files:
+        tasks.append((os.path.join(input_folder, image_file),
+                      os.path.join(output_folder, output_files[image_file]),
+                      file_seed(seed, image_file), params, key))
+
+    # 各进程按开始处理前的清单快照判断是否跳过，结果与进程数无关
+    snapshot = copy.deepcopy(manifest)
+    processed_count = 0
+    failed_count = 0
+
+    start = time.perf_counter()
+    executor = None
+    if workers > 1:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                       initargs=(cv2_threads, light_bank_path, shadow_bank_path, snapshot))
+        results = executor.map(_process_file, tasks, chunksize=max(1, len(tasks) // (workers * 4)))
+    else:
+        # 场库只打开一次，以内存映射方式供所有图像共享
+        _init_worker(None, light_bank_path, shadow_bank_path, snapshot)
+        results = map(_process_file, tasks)
+    try:
+        for status, record in results:
+            if status == 'done':
+                processed_count += 1
+                if record is not None:
+                    manifest.commit(*record)
+            elif status == 'skipped':
+                skipped_count += 1
+            else:
+                failed_count += 1
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+    elapsed = time.perf_counter() - start
+
+    total = processed_count + failed_count
+    print(f"处理完成! 成功处理: {processed_count} 张图像, 跳过: {skipped_count} 张图像, 失败: {failed_count} 张图像, "
+          f"耗时 {elapsed:.2f}s ({total / max(elapsed, 1e-9):.2f} 张/s), 进程数 {workers}, 种子 {seed}")
+    return processed_count, failed_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='对图像同时应用光照和阴影效果模拟')
+    parser.add_argument('--input_folder', type=str, default="/media/qinyh/KINGSTON/MetaData/background_data_resized/yuyan", help='输入图像文件夹路径')
+    parser.add_argument('--output_folder', type=str, default=None, help='输出图像文件夹路径，默认与输入文件夹相同')
+    parser.add_argument('--suffix', type=str, default='', help='输出文件名后缀（如 _light、_shadow），为空时同名覆盖')
+    parser.add_argument('--max_lights', type=int, default=10, help='最大光源数量，0表示不加光照')
+    parser.add_argument('--max_shadows', type=int, default=10, help='最大阴影数量，0表示不加阴影')
+    parser.add_argument('--light_intensity', type=float, nargs=2, default=[10, 20], help='光源强度范围')
+    parser.add_argument('--shadow_intensity', type=float, nargs=2, default=[0.75, 0.95], help='阴影中心亮度系数范围')
+    parser.add_argument('--field_scale', type=int, default=1, help='粗网格的缩小倍数（如8），1表示全分辨率计算')
+    parser.add_argument('--light_bank', type=str, default=None, help='预计算的光照场库路径')
+    parser.add_argument('--shadow_bank', type=str, default=None, help='预计算的阴影场库路径')
+    parser.add_argument('--workers', type=int, default=1, help='并行处理的进程数')
+    parser.add_argument('--seed', type=int, default=None, help='总随机种子，每张图像的种子由它和文件名得到')
+    parser.add_argument('--low_memory', action='store_true', help='低内存模式：场以 uint16 定点数保存，用OpenCV饱和运算叠加')
+    parser.add_argument('--band_rows', type=int, default=0, help='按水平条带逐段处理时每条带的行数（如256），0表示整幅处理')
+    parser.add_argument('--manifest', action='store_true', help='在输出文件夹中维护已处理内容的清单，跳过已完成的图像并支持断点续跑')
+
+    args = parser.parse_args()
+    if args.output_folder is None:
+        args.output_folder = args.input_folder
+
+    process_folder(args.input_folder, args.output_folder, args.suffix, args.max_lights, args.max_shadows,
+                   tuple(args.light_intensity), tuple(args.shadow_intensity), args.field_scale,
+                   args.light_bank, args.shadow_bank, args.workers, args.seed,
+                   use_manifest=args.manifest or args.output_folder == args.input_folder, low_memory=args.low_memory,
+                   band_rows=args.band_rows)
+
+if __name__ == "__main__":
+    main()
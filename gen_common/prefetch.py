@@ -0,0 +1,145 @@
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import cv2
+
+_STOP = object()
+
+
+class StageTimer:
+    """
+    线程安全的分阶段计时器，用于观察流水线中各阶段的耗时与重叠情况。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.totals = {}
+        self.counts = {}
+
+    def add(self, name, seconds):
+        with self._lock:
+            self.totals[name] = self.totals.get(name, 0.0) + seconds
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def report(self, wall_time):
+        """
+        打印各阶段耗时。各阶段耗时之和超过总耗时的部分即为并行重叠的时间。
+
+        :param wall_time: 流水线总耗时（秒）
+        """
+        # 以 _wait 结尾的阶段是消费者的等待时间，不计入忙碌时间
+        busy = sum(total for name, total in self.totals.items() if not name.endswith('_wait'))
+        print(f"流水线总耗时: {wall_time:.2f}s")
+        for name, total in self.totals.items():
+            print(f"  - {name}: {total:.2f}s / {self.counts[name]} 次")
+        overlap = max(busy - wall_time, 0.0)
+        ratio = overlap / wall_time if wall_time > 0 else 0.0
+        print(f"  - 阶段耗时合计: {busy:.2f}s, 重叠时间: {overlap:.2f}s ({ratio:.0%})")
+
+
+def prefetch(load_func, items, depth=2, timer=None, name='load'):
+    """
+    在后台线程中按顺序对 items 调用 load_func，最多提前准备 depth 个结果。
+
+    cv2.imread 等解码操作会释放GIL，因此读取磁盘与主线程的计算可以重叠。
+
+    :param load_func: 加载函数，参数为单个 item
+    :param items: 待加载的任务序列
+    :param depth: 预取队列深度
+    :param timer: 可选的 StageTimer，记录加载耗时和主线程等待耗时
+    :param name: 加载阶段在计时器中的名称
+    :return: 生成 (item, 加载结果) 的迭代器
+    """
+    results = queue.Queue(maxsize=max(depth, 1))
+    stop_event = threading.Event()
+
+    def worker():
+        try:
+            for item in items:
+                if stop_event.is_set():
+                    return
+                start = time.perf_counter()
+                loaded = load_func(item)
+                if timer is not None:
+                    timer.add(name, time.perf_counter() - start)
+                results.put((item, loaded, None))
+        except Exception as e:
+            results.put((None, None, e))
+        finally:
+            results.put(_STOP)
+
+    thread = threading.Thread(target=worker, daemon=True)
+    thread.start()
+    try:
+        while True:
+            start = time.perf_counter()
+            entry = results.get()
+            if timer is not None:
+                timer.add(f"{name}_wait", time.perf_counter() - start)
+            if entry is _STOP:
+                break
+            item, loaded, error = entry
+            if error is not None:
+                raise error
+            yield item, loaded
+    finally:
+        stop_event.set()
+        # 清空队列，避免后台线程阻塞在 put 上
+        while thread.is_alive():
+            try:
+                results.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        thread.join()
+
+
+class BackgroundWriter:
+    """
+    在后台线程中编码并保存图像，写入队列满时 submit 会阻塞。
+    """
+
+    def __init__(self, depth=2, timer=None, name='write'):
+        self.timer = timer
+        self.name = name
+        self.error = None
+        self._queue = queue.Queue(maxsize=max(depth, 1))
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            entry = self._queue.get()
+            if entry is _STOP:
+                return
+            path, image = entry
+            if self.error is not None:
+                continue
+            start = time.perf_counter()
+            try:
+                if not cv2.imwrite(path, image):
+                    raise IOError(f"无法保存图像: {path}")
+            except Exception as e:
+                self.error = e
+            if self.timer is not None:
+                self.timer.add(self.name, time.perf_counter() - start)
+
+    def submit(self, path, image):
+        if self.error is not None:
+            raise self.error
+        self._queue.put((path, image))
+
+    def close(self):
+        self._queue.put(_STOP)
+        self._thread.join()
+        if self.error is not None:
+            raise self.error
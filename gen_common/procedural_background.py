@@ -0,0 +1,142 @@
+import argparse
+import functools
+import json
+import os
+import sys
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from gen_common.border_stats import (list_images, folder_border_histogram, trimmed_stats,
+                                     inverse_cdf_lut, sample_lut)
+from gen_common.spectral_background import SpectralBackground
+from gen_common.stats_cache import open_cache
+from gen_common.image_size import read_image_size
+from gen_common.scaled_assets import scaled_size
+from gen_common.tiled_background import TiledBackground
+
+
+def fit_class_stats(img_folder, output_path, defect_class, workers=1, use_cache=True):
+    """
+    统计一类缺陷背景图片边框像素的灰度直方图，保存为程序化背景使用的统计文件
+
+    :param img_folder: 该类背景图片所在文件夹
+    :param output_path: 统计文件路径（.json）
+    :param defect_class: 缺陷类别（madian / yuyan / qipao）
+    :param workers: 并行统计的进程数
+    :param use_cache: 是否使用图片文件夹中的统计缓存，已统计过的图片不再解码
+    :return: 统计内容，没有可用图片时返回None
+    """
+    img_files = list_images(img_folder)
+    if not img_files:
+        print(f"文件夹 {img_folder} 中没有找到图片！")
+        return None
+
+    # 背景本身为灰度图，只统计一个通道
+    cache = open_cache(img_folder, use_cache)
+    hist, failed = folder_border_histogram(img_files, flags=cv2.IMREAD_GRAYSCALE, workers=workers, cache=cache)
+    if cache is not None:
+        cache.close()
+    for img_path in failed:
+        print(f"无法读取图像：{img_path}")
+    if hist is None:
+        return None
+
+    # 生成的背景与样本图片同样大小，尺寸只读取文件头，不解码像素
+    first = next(p for p in img_files if p not in failed)
+    width, height = read_image_size(first)
+    mean, std = trimmed_stats(hist[0])
+    stats = {
+        'defect_class': defect_class,
+        'images': len(img_files) - len(failed),
+        'height': height,
+        'width': width,
+        'mean': mean,
+        'std': std,
+        'hist': hist[0].tolist(),
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, 'w') as f:
+        json.dump(stats, f)
+    print(f"{defect_class} 背景统计已保存到: {output_path} (均值 {mean:.2f}, 标准差 {std:.2f}, {stats['images']} 张)")
+    return stats
+
+
+class ProceduralBackground:
+    """
+    按拟合的背景统计在内存中直接生成背景，不需要背景文件，也没有解码开销
+
+    mode 为 'empirical' 时按边框像素的经验分布逐像素独立采样（同 gen_background_dis.py）；
+    为 'gaussian' 时按去掉 3%-97% 分位数之外像素后拟合的高斯分布采样（同 gen_background.py）。
+    scale 小于1时直接按缩小后的尺寸生成，逐像素的分布不变。
+    """
+
+    MODES = ('empirical', 'gaussian')
+
+    def __init__(self, stats_path, mode='empirical', height=None, width=None, scale=1.0):
+        if mode not in self.MODES:
+            raise ValueError(f"不支持的背景生成方式: {mode}")
+        with open(stats_path) as f:
+            self.stats = json.load(f)
+        self.mode = mode
+        default_width, default_height = scaled_size(self.stats['width'], self.stats['height'], scale)
+        self.height = height or default_height
+        self.width = width or default_width
+        self.lut = inverse_cdf_lut(np.asarray(self.stats['hist'], dtype=np.int64))
+
+    def generate(self, seed, grayscale=False):
+        """
+        生成一张新背景，相同种子得到相同背景
+
+        :param seed: 随机种子
+        :param grayscale: 为True时返回单通道，否则返回三通道相同的 BGR 图像
+        :return: (height, width) 或 (height, width, 3) 的 uint8 图像
+        """
+        rng = np.random.default_rng(seed)
+        shape = (self.height, self.width)
+        if self.mode == 'empirical':
+            background = sample_lut(self.lut, shape, rng)
+        else:
+            background = rng.normal(self.stats['mean'], self.stats['std'], shape).clip(0, 255).astype(np.uint8)
+        if grayscale:
+            return background
+        return cv2.cvtColor(background, cv2.COLOR_GRAY2BGR)
+
+
+# 按功率谱生成的方式，统计文件为 gen_common/spectral_background.py 估计的频谱模型（.npz）
+SPECTRAL_MODE = 'spectral'
+# 循环平铺小图的方式，统计文件为平铺用的小图，每张背景随机平移相位
+TILED_MODE = 'tiled'
+SOURCE_MODES = ProceduralBackground.MODES + (SPECTRAL_MODE, TILED_MODE)
+
+
+@functools.lru_cache(maxsize=None)
+def load_source(stats_path, mode='empirical', scale=1.0):
+    """每个进程只加载一次统计文件和查找表（频谱模型的幅度谱在第一次生成时计算一次）"""
+    if mode == SPECTRAL_MODE:
+        return SpectralBackground(stats_path, scale=scale)
+    if mode == TILED_MODE:
+        source = TiledBackground.from_file(stats_path, scale=scale)
+        if source is None:
+            raise ValueError(f"无法读取平铺小图: {stats_path}")
+        return source
+    return ProceduralBackground(stats_path, mode, scale=scale)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='统计背景图片的灰度分布，供合成脚本程序化生成背景')
+    parser.add_argument('--img_folder', type=str, default="/media/qinyh/KINGSTON/MetaData/background_data_resized/qipao", help='背景图片文件夹路径')
+    parser.add_argument('--defect_class', type=str, default='qipao', choices=['madian', 'yuyan', 'qipao'], help='缺陷类别')
+    parser.add_argument('--output', type=str, default=None, help='统计文件路径，默认为 gen_<类别>/background_stats.json')
+    parser.add_argument('--workers', type=int, default=1, help='并行统计的进程数')
+    parser.add_argument('--no_stats_cache', action='store_true', help='不使用图片文件夹中的统计缓存，重新解码所有图片')
+
+    args = parser.parse_args()
+    if args.output is None:
+        args.output = f"gen_{args.defect_class}/background_stats.json"
+
+    fit_class_stats(args.img_folder, args.output, args.defect_class, args.workers, not args.no_stats_cache)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import os
+import threading
+
+import cv2
+
+from gen_common.manifest import write_temp
+
+# 缩放后素材的缓存目录，放在素材所在文件夹中，按缩放比例分子目录
+SCALED_DIR = '.scaled'
+
+
+def scaled_size(width, height, scale):
+    """按比例缩放后的 (宽, 高)，至少为1个像素"""
+    return max(1, int(round(width * scale))), max(1, int(round(height * scale)))
+
+
+def scaled_gaussian(ksize, scale):
+    """
+    缩放后与原高斯模糊效果相当的 (核大小, sigma)
+
+    原核的 sigma 按 OpenCV 由核大小推算（sigma 传0时的公式），缩放后 sigma 同比例缩小，核大小取最接近的奇数。
+    scale 为1时原样返回 (ksize, 0)，结果与原先完全一致。
+    """
+    if scale == 1:
+        return ksize, 0
+    sigma = (0.3 * ((ksize - 1) * 0.5 - 1) + 0.8) * scale
+    return max(1, int(round(ksize * scale)) // 2 * 2 + 1), sigma
+
+
+def scaled_asset_path(path, scale):
+    """缓存文件路径：<素材文件夹>/.scaled/<比例>/<文件名>，非 PNG 素材另存为无损 PNG"""
+    folder, name = os.path.split(path)
+    if not name.lower().endswith('.png'):
+        name += '.png'
+    return os.path.join(folder, SCALED_DIR, f"{scale:g}", name)
+
+
+def read_scaled(path, scale, flags=cv2.IMREAD_COLOR, mask=False):
+    """
+    读取按比例缩小的素材（背景、小图或掩码）
+
+    第一次读取时由原图缩放并写入缓存，之后各次运行直接解码缓存中的小图；原图比缓存新时重新生成。
+    缓存保存原图所有通道，灰度读取等由 flags 在读取缓存时处理。
+    写入先写临时文件再重命名，其他进程不会读到写了一半的缓存。
+
+    :param path: 原图路径
+    :param scale: 缩放比例，为1时直接读取原图
+    :param flags: cv2.imread 的读取方式
+    :param mask: 是否为掩码/标签图，掩码用最近邻插值以保持颜色不变，其余用区域插值
+    :return: 图像，读取失败时返回None
+    """
+    if scale == 1:
+        return cv2.imread(path, flags)
+
+    cached = scaled_asset_path(path, scale)
+    try:
+        if os.path.getmtime(cached) >= os.path.getmtime(path):
+            image = cv2.imread(cached, flags)
+            if image is not None:
+                return image
+    except OSError:
+        pass
+
+    image = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+    if image is None:
+        return None
+    size = scaled_size(image.shape[1], image.shape[0], scale)
+    scaled = cv2.resize(image, size, interpolation=cv2.INTER_NEAREST if mask else cv2.INTER_AREA)
+    ok, encoded = cv2.imencode('.png', scaled)
+    if ok:
+        os.makedirs(os.path.dirname(cached), exist_ok=True)
+        # 临时文件名带进程号和线程号，多个进程/线程同时生成同一素材时互不覆盖
+        tmp = write_temp(f"{cached}.{os.getpid()}.{threading.get_ident()}", encoded.tobytes())
+        os.replace(tmp, cached)
+    return cv2.imdecode(encoded, flags) if ok else None
@@ -0,0 +1,114 @@
+import heapq
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+
+# 各类缺陷单张图像的估计耗时：(固定开销, 每个小图的开销)，单位为相对值
+# 固定开销包括背景解码、平滑和编码；madian/yuyan 需要按掩码粘贴并做高斯模糊，qipao 直接覆盖粘贴
+CLASS_COSTS = {
+    'madian': (8.0, 1.0),
+    'yuyan': (8.0, 1.0),
+    'qipao': (6.0, 0.6),
+}
+
+# 按图像索引划分的小图数量档位：(索引上限, 最少小图数, 最多小图数)
+DENSITY_TIERS = [
+    (200, 5, 10),    # 少量
+    (600, 10, 35),   # 中等
+    (1000, 35, 50),  # 大量
+]
+
+
+def tier_patch_range(index):
+    """返回索引所在档位的小图数量范围 (最少, 最多)，超出范围返回None"""
+    for upper, low, high in DENSITY_TIERS:
+        if index < upper:
+            return low, high
+    return None
+
+
+def estimate_cost(defect_class, index, num_patches=None):
+    """
+    估计生成一张图像的相对耗时
+
+    :param defect_class: 缺陷类别（madian / yuyan / qipao）
+    :param index: 图像索引，用于确定档位
+    :param num_patches: 已抽取的小图数量；为None时使用档位的期望值
+    """
+    base, per_patch = CLASS_COSTS.get(defect_class, (8.0, 1.0))
+    if num_patches is None:
+        patch_range = tier_patch_range(index)
+        num_patches = sum(patch_range) / 2 if patch_range else 0
+    return base + per_patch * num_patches
+
+
+def plan_chunks(jobs, costs, workers, chunks_per_worker=4):
+    """
+    将任务划分为耗时均衡的若干块
+
+    先按耗时从大到小排序，再依次放入当前总耗时最小的块（LPT贪心）。
+    返回的块按耗时从大到小排列，进程池动态取块时先处理大块，尾部由小块填平。
+
+    :param jobs: 任务列表
+    :param costs: 与 jobs 一一对应的估计耗时
+    :param workers: 进程数
+    :param chunks_per_worker: 每个进程平均分到的块数
+    :return: [(块耗时, [任务, ...]), ...]
+    """
+    num_chunks = max(1, min(len(jobs), workers * chunks_per_worker))
+    heap = [(0.0, i) for i in range(num_chunks)]
+    chunks = [[] for _ in range(num_chunks)]
+    chunk_costs = [0.0] * num_chunks
+
+    for k in sorted(range(len(jobs)), key=lambda k: costs[k], reverse=True):
+        total, i = heapq.heappop(heap)
+        chunks[i].append(jobs[k])
+        chunk_costs[i] = total + costs[k]
+        heapq.heappush(heap, (chunk_costs[i], i))
+
+    planned = [(chunk_costs[i], chunks[i]) for i in range(num_chunks) if chunks[i]]
+    planned.sort(key=lambda t: t[0], reverse=True)
+    return planned
+
+
+def _init_worker(cv2_threads):
+    # 每个进程只使用少量OpenCV线程，避免进程数 x 线程数 超出核数
+    cv2.setNumThreads(cv2_threads)
+
+
+def _run_chunk(func, chunk):
+    start = time.perf_counter()
+    results = [func(job) for job in chunk]
+    return os.getpid(), time.perf_counter() - start, results
+
+
+def run_balanced(func, jobs, costs, workers, chunks_per_worker=4, cv2_threads=1):
+    """
+    按估计耗时将任务均衡地分块，并在进程池中执行
+
+    :param func: 处理单个任务的函数（需可被pickle，即模块级函数或其 partial）
+    :param jobs: 任务列表
+    :param costs: 与 jobs 一一对应的估计耗时
+    :param workers: 进程数
+    :return: 所有任务的结果列表（顺序与完成顺序一致）
+    """
+    chunks = plan_chunks(jobs, costs, workers, chunks_per_worker)
+    print(f"共 {len(jobs)} 个任务，划分为 {len(chunks)} 块，使用 {workers} 个进程")
+
+    results = []
+    busy = {}
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(cv2_threads,)) as executor:
+        futures = [executor.submit(_run_chunk, func, chunk) for _, chunk in chunks]
+        for future in as_completed(futures):
+            pid, elapsed, chunk_results = future.result()
+            busy[pid] = busy.get(pid, 0.0) + elapsed
+            results.extend(chunk_results)
+    wall_time = time.perf_counter() - start
+
+    print(f"总耗时: {wall_time:.2f}s")
+    for pid, seconds in sorted(busy.items()):
+        print(f"  - 进程 {pid}: 忙碌 {seconds:.2f}s")
+    return results
@@ -0,0 +1,269 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+from scipy import fft
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from gen_common.border_stats import list_images
+from gen_common.scaled_assets import scaled_size
+
+# 估计功率谱时的分块边长，频率分辨率为 1/SPECTRUM_TILE 周期/像素
+SPECTRUM_TILE = 512
+
+
+def tile_power_spectrum(image, tile=SPECTRUM_TILE):
+    """
+    按不重叠的 tile x tile 分块估计一张灰度图的功率谱（Welch 法，汉宁窗，每块先减去自身均值）
+
+    :param image: (H, W) 灰度图
+    :return: (功率谱之和 (tile, tile//2+1) float64, 分块数)，图像小于一个分块时分块数为0
+    """
+    rows, cols = image.shape[0] // tile, image.shape[1] // tile
+    if rows == 0 or cols == 0:
+        return np.zeros((tile, tile // 2 + 1)), 0
+
+    blocks = image[:rows * tile, :cols * tile].astype(np.float32)
+    blocks = blocks.reshape(rows, tile, cols, tile).swapaxes(1, 2).reshape(-1, tile, tile)
+    blocks -= blocks.mean(axis=(1, 2), keepdims=True)
+    window = np.outer(np.hanning(tile), np.hanning(tile)).astype(np.float32)
+    blocks *= window
+
+    # 归一化后各频点功率的平均值等于像素方差
+    spectrum = np.abs(fft.rfft2(blocks)) ** 2 / float((window ** 2).sum())
+    return spectrum.sum(axis=0, dtype=np.float64), len(blocks)
+
+
+def _spectrum_chunk(img_paths, tile):
+    """累加一组图片的功率谱和像素和，返回 (功率谱之和, 分块数, 像素和, 像素数, 图像尺寸, 读取失败的路径)"""
+    total = np.zeros((tile, tile // 2 + 1))
+    blocks = 0
+    pixel_sum = 0.0
+    pixels = 0
+    shape = None
+    failed = []
+    for img_path in img_paths:
+        image = cv2.imread(img_path, cv2.IMREAD_GRAYSCALE)
+        if image is None:
+            failed.append(img_path)
+            continue
+        spectrum, count = tile_power_spectrum(image, tile)
+        total += spectrum
+        blocks += count
+        pixel_sum += float(image.sum(dtype=np.float64))
+        pixels += image.size
+        shape = shape or image.shape
+    return total, blocks, pixel_sum, pixels, shape, failed
+
+
+def _init_worker():
+    # 每个进程只处理一张图，OpenCV内部不再开线程
+    cv2.setNumThreads(1)
+
+
+def fit_spectrum(img_folder, output_path, tile=SPECTRUM_TILE, workers=1):
+    """
+    估计一批无缺陷背景图片的平均功率谱和灰度均值，保存为频谱模型（.npz）
+
+    :param img_folder: 背景图片文件夹
+    :param output_path: 模型文件路径
+    :param tile: 分块边长
+    :param workers: 并行统计的进程数
+    :return: 模型内容，没有可用图片时返回None
+    """
+    img_files = list_images(img_folder)
+    if not img_files:
+        print(f"文件夹 {img_folder} 中没有找到图片！")
+        return None
+
+    if workers > 1 and len(img_files) > 1:
+        chunks = [img_files[i::workers] for i in range(min(workers, len(img_files)))]
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+            results = list(executor.map(_spectrum_chunk, chunks, [tile] * len(chunks)))
+    else:
+        results = [_spectrum_chunk(img_files, tile)]
+
+    spectrum = sum(r[0] for r in results)
+    blocks = sum(r[1] for r in results)
+    pixel_sum = sum(r[2] for r in results)
+    pixels = sum(r[3] for r in results)
+    shape = next((r[4] for r in results if r[4] is not None), None)
+    failed = [p for r in results for p in r[5]]
+    for img_path in failed:
+        print(f"无法读取图像：{img_path}")
+    if blocks == 0:
+        print(f"没有大于 {tile}x{tile} 的可用图片，无法估计功率谱")
+        return None
+
+    model = {
+        'power': (spectrum / blocks).astype(np.float32),
+        'mean': pixel_sum / pixels,
+        'height': shape[0],
+        'width': shape[1],
+        'images': len(img_files) - len(failed),
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    np.savez(output_path, **model)
+    std = float(np.sqrt(full_plane_mean(model['power'])))
+    print(f"功率谱模型已保存到: {output_path} (均值 {model['mean']:.2f}, 标准差 {std:.2f}, "
+          f"{model['images']} 张, {blocks} 个分块)")
+    return model
+
+
+def full_plane_mean(half):
+    """
+    rfft 半平面数组在整个频率平面上的平均值
+
+    除第0列和 Nyquist 列（宽度为偶数时）外，每一列在负频率一侧都有一个共轭对称的对应列。
+    """
+    width = 2 * (half.shape[1] - 1)
+    total = 2 * half.sum(dtype=np.float64) - half[:, 0].sum(dtype=np.float64) - half[:, -1].sum(dtype=np.float64)
+    return total / (half.shape[0] * width)
+
+
+def resample_power(power, height, width, scale=1.0):
+    """
+    将分块功率谱双线性插值到 height x width 图像的 rfft 频率网格上
+
+    两者的频率坐标都是均匀网格，插值是一个仿射变换；负频率一侧先移到上方，
+    再在下方补一行 +Nyquist（与 -Nyquist 相同）使插值覆盖完整的频率周期。
+    scale 小于1时目标图像相当于样本缩小 scale 倍，目标的频率 f 对应样本的 f*scale，只取样本频带的中间部分。
+
+    :param power: (tile, tile//2+1) 分块功率谱，行按 fft 频率顺序
+    :param scale: 目标图像相对样本的缩放比例（不大于1）
+    :return: (height, width//2+1) float32 功率谱，行按 fft 频率顺序
+    """
+    tile = power.shape[0]
+    shifted = np.fft.fftshift(power, axes=0)
+    shifted = np.vstack([shifted, shifted[:1]])
+
+    # 目标第 j 行（移位后）的频率为 (j - height//2)/height，对应分块功率谱的第 tile/2 + 频率*scale*tile 行
+    step_x = tile * scale / width
+    step_y = tile * scale / height
+    matrix = np.float32([[step_x, 0, 0],
+                         [0, step_y, tile / 2 - (height // 2) * step_y]])
+    resampled = cv2.warpAffine(shifted, matrix, (width // 2 + 1, height),
+                               flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP, borderMode=cv2.BORDER_REPLICATE)
+    return np.fft.ifftshift(resampled, axes=0)
+
+
+class SpectralBackground:
+    """
+    按拟合的功率谱在内存中生成背景：每个频点取拟合的幅度和均匀随机的相位，做一次逆 FFT
+
+    生成的背景与样本具有相同的均值、方差和空间相关性（颗粒大小、条纹方向等），不再是逐像素独立的噪声。
+    逆 FFT 为循环卷积，生成的背景左右、上下可以无缝拼接。
+    scale 小于1时直接生成相当于样本缩小 scale 倍的背景：纹理同比例变细，超出缩小后 Nyquist 频率的细节被舍去。
+    """
+
+    def __init__(self, model_path, height=None, width=None, workers=-1, scale=1.0):
+        with np.load(model_path) as model:
+            self.power = model['power']
+            self.mean = float(model['mean'])
+            default_width, default_height = scaled_size(int(model['width']), int(model['height']), scale)
+            self.height = height or default_height
+            self.width = width or default_width
+        self.std = float(np.sqrt(full_plane_mean(self.power)))
+        self.scale = scale
+        self.workers = workers
+        self._amplitude = None
+
+    @property
+    def amplitude(self):
+        """
+        目标尺寸下每个频点的幅度，只计算一次
+
+        单位幅度的随机相位每个频点功率为1；逆 FFT 按 1/(H*W) 归一化，
+        因此输出方差为 平均功率 / (H*W)，据此缩放使输出标准差等于样本标准差。
+        缩小时输出方差为保留频带内的功率：频带面积 scale**2 乘以频带内的平均功率。
+        """
+        if self._amplitude is None:
+            power = resample_power(self.power, self.height, self.width, self.scale)
+            power[0, 0] = 0
+            variance = self.std ** 2 if self.scale == 1 else self.scale ** 2 * full_plane_mean(power)
+            scale = np.sqrt(variance * self.height * self.width / full_plane_mean(power))
+            self._amplitude = np.sqrt(power) * np.float32(scale)
+        return self._amplitude
+
+    def generate(self, seed, grayscale=False):
+        """
+        生成一张新背景，相同种子得到相同背景
+
+        :param seed: 随机种子
+        :param grayscale: 为True时返回单通道，否则返回三通道相同的 BGR 图像
+        :return: (height, width) 或 (height, width, 3) 的 uint8 图像
+        """
+        rng = np.random.default_rng(seed)
+        # 随机相位只需一组均匀随机数，比逐频点抽取复高斯噪声快约3倍；像素值由大量频点叠加，仍近似高斯分布
+        phase = rng.random(self.amplitude.shape, dtype=np.float32)
+        phase *= np.float32(2 * np.pi)
+        spectrum = np.empty(phase.shape, dtype=np.complex64)
+        np.cos(phase, out=spectrum.real)
+        np.sin(phase, out=spectrum.imag)
+        spectrum *= self.amplitude
+        # 直流分量决定均值，加 0.5 使之后的截断取整变为四舍五入
+        spectrum[0, 0] = (self.mean + 0.5) * self.height * self.width
+
+        background = fft.irfft2(spectrum, s=(self.height, self.width), workers=self.workers, overwrite_x=True)
+        np.clip(background, 0, 255, out=background)
+        background = background.astype(np.uint8)
+        if grayscale:
+            return background
+        return cv2.cvtColor(background, cv2.COLOR_GRAY2BGR)
+
+
+def output_paths(output_path, count):
+    """生成多张时在文件名后加序号"""
+    if count == 1:
+        return [output_path]
+    base, ext = os.path.splitext(output_path)
+    return [f"{base}_{i:03d}{ext}" for i in range(count)]
+
+
+def generate_backgrounds(model_path, output_path, count=1, seed=None, height=None, width=None, workers=-1):
+    """
+    按频谱模型批量生成背景，幅度谱只计算一次
+
+    每张背景的种子由 seed 派生并打印出来，任意一张都可以单独用该种子重新生成。
+    """
+    source = SpectralBackground(model_path, height, width, workers)
+    seeds = np.random.default_rng(seed).integers(0, 1 << 63, size=count)
+    start = time.perf_counter()
+    for path, image_seed in zip(output_paths(output_path, count), seeds):
+        generated_image = source.generate(int(image_seed), grayscale=True)
+        cv2.imwrite(path, generated_image)
+        print(f"生成的图像已保存到：{path} (种子 {image_seed})")
+    elapsed = time.perf_counter() - start
+    print(f"共生成 {count} 张 {source.width}x{source.height} 背景，平均每张 {elapsed / max(count, 1):.2f} 秒（含保存）")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='估计无缺陷背景图片的功率谱，并按功率谱对随机噪声整形生成新背景')
+    parser.add_argument('--img_folder', type=str, default=None, help='背景图片文件夹路径，给定时重新估计功率谱并保存模型')
+    parser.add_argument('--model', type=str, default="gen_qipao/background_spectrum.npz", help='功率谱模型文件路径')
+    parser.add_argument('--output_path', type=str, default="gen_qipao/Background_spectral.bmp", help='输出图像路径，生成多张时自动加序号')
+    parser.add_argument('--count', type=int, default=1, help='生成背景的数量，为0时只估计功率谱')
+    parser.add_argument('--seed', type=int, default=None, help='随机种子')
+    parser.add_argument('--height', type=int, default=None, help='生成图像高度，默认与样本图片相同')
+    parser.add_argument('--width', type=int, default=None, help='生成图像宽度，默认与样本图片相同')
+    parser.add_argument('--tile', type=int, default=SPECTRUM_TILE, help='估计功率谱的分块边长')
+    parser.add_argument('--workers', type=int, default=1, help='估计功率谱的进程数')
+
+    args = parser.parse_args()
+
+    if args.img_folder is not None:
+        if fit_spectrum(args.img_folder, args.model, args.tile, args.workers) is None:
+            return
+    elif not os.path.exists(args.model):
+        print(f"模型文件 {args.model} 不存在，请先用 --img_folder 估计功率谱")
+        return
+
+    if args.count > 0:
+        generate_backgrounds(args.model, args.output_path, args.count, args.seed, args.height, args.width)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import json
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+
+from gen_common.manifest import content_hash
+
+# 图片统计缓存的文件名，放在图片所在文件夹中，扩展名不是图像扩展名，不会被当作输入图像
+CACHE_NAME = '.image_stats.sqlite'
+
+
+def _init_worker():
+    # 每个进程只解码一张图，OpenCV内部不再开线程
+    cv2.setNumThreads(1)
+
+
+class StatsCache:
+    """
+    每张图片的小型统计（边框直方图、边框均值/标准差等）的持久缓存，保存在图片文件夹的 sqlite 数据库中
+
+    files 表记录 文件名 -> (大小, 修改时间, 内容哈希)，大小和修改时间都未变时直接使用记录的哈希，不再读取文件；
+    stats 表以 (内容哈希, 统计类型) 为键保存 JSON 编码的统计值，因此改名或复制的图片也能复用已有统计。
+    只在主进程中读写数据库，进程池中的子进程只负责解码和计算。
+    """
+
+    def __init__(self, folder, name=CACHE_NAME):
+        self.folder = folder
+        self.path = os.path.join(folder, name)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS files '
+                          '(name TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, hash TEXT)')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS stats '
+                          '(hash TEXT, kind TEXT, value TEXT, PRIMARY KEY (hash, kind))')
+        self.conn.commit()
+
+    def _name(self, img_path):
+        return os.path.relpath(img_path, self.folder)
+
+    def file_hash(self, img_path):
+        """图片内容哈希：大小和修改时间与记录一致时直接返回记录，否则读取文件重新计算并更新记录"""
+        st = os.stat(img_path)
+        name = self._name(img_path)
+        row = self.conn.execute('SELECT size, mtime_ns, hash FROM files WHERE name = ?', (name,)).fetchone()
+        if row is not None and row[0] == st.st_size and row[1] == st.st_mtime_ns:
+            return row[2]
+        with open(img_path, 'rb') as f:
+            digest = content_hash(f.read())
+        self.conn.execute('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)',
+                          (name, st.st_size, st.st_mtime_ns, digest))
+        return digest
+
+    def get(self, digest, kind):
+        row = self.conn.execute('SELECT value FROM stats WHERE hash = ? AND kind = ?', (digest, kind)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def put(self, digest, kind, value):
+        self.conn.execute('INSERT OR REPLACE INTO stats VALUES (?, ?, ?)', (digest, kind, json.dumps(value)))
+
+    def map(self, img_paths, kind, compute, workers=1):
+        """
+        返回每张图片的统计，缓存中没有的才调用 compute 计算（workers 大于1时在进程池中计算），并写入缓存
+
+        :param img_paths: 图片路径列表，应位于缓存所在文件夹中
+        :param kind: 统计类型，包含影响结果的参数（如读取方式）
+        :param compute: compute(图片路径) 返回可 JSON 编码的统计，读取失败时返回None（不缓存）；须为模块级函数
+        :return: 与 img_paths 一一对应的统计列表
+        """
+        results = [None] * len(img_paths)
+        missing = []
+        for i, img_path in enumerate(img_paths):
+            try:
+                digest = self.file_hash(img_path)
+            except OSError:
+                continue
+            value = self.get(digest, kind)
+            if value is None:
+                missing.append((i, digest))
+            else:
+                results[i] = value
+
+        paths = [img_paths[i] for i, _ in missing]
+        if workers > 1 and len(paths) > 1:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+                computed = list(executor.map(compute, paths, chunksize=max(1, len(paths) // (workers * 4))))
+        else:
+            computed = [compute(p) for p in paths]
+
+        for (i, digest), value in zip(missing, computed):
+            if value is None:
+                continue
+            self.put(digest, kind, value)
+            results[i] = value
+        self.conn.commit()
+        if img_paths:
+            print(f"统计缓存 {self.path}: 命中 {len(img_paths) - len(missing)} 张, 新计算 {len(missing)} 张")
+        return results
+
+    def close(self):
+        self.conn.close()
+
+
+def open_cache(folder, enabled=True):
+    """打开文件夹的统计缓存；未启用或文件夹不可写时返回None，调用方按无缓存处理"""
+    if not enabled:
+        return None
+    try:
+        return StatsCache(folder)
+    except sqlite3.Error as e:
+        print(f"无法打开统计缓存 {os.path.join(folder, CACHE_NAME)}: {e}，不使用缓存")
+        return None
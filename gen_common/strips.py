@@ -0,0 +1,47 @@
+import numpy as np
+
+# 默认每条带的行数：5472 宽的灰度图约 2.7 MB，float32 临时数组约 11 MB
+STRIP_ROWS = 512
+
+
+def band_ranges(height, band_rows=STRIP_ROWS):
+    """按 band_rows 行划分 [0, height)，返回 [(起始行, 结束行), ...]"""
+    return [(y0, min(y0 + band_rows, height)) for y0 in range(0, height, band_rows)]
+
+
+def run_strips(func, height, out, band_rows=STRIP_ROWS, halo=0):
+    """
+    按水平条带逐段处理整幅图像，结果写入同一个输出缓冲区
+
+    逐像素的运算取 halo=0；带卷积核的运算（如 7x7 高斯模糊）取 halo 为核半径，
+    每条带向上下各多取 halo 行计算，只写回中间部分，结果与整幅处理一致。
+    图像上下边缘处不扩展，由运算自身的边界处理（与整幅处理相同）。
+
+    :param func: func(y0, y1) 返回第 y0 到 y1 行（含 halo）的处理结果
+    :param height: 图像高度
+    :param out: 输出缓冲区，第0维为行
+    :param band_rows: 每条带的行数（不含 halo）
+    :param halo: 上下各扩展的行数
+    :return: out
+    """
+    for y0, y1 in band_ranges(height, band_rows):
+        top = min(halo, y0)
+        bottom = min(halo, height - y1)
+        rows = func(y0 - top, y1 + bottom)
+        out[y0:y1] = rows[top:top + y1 - y0]
+    return out
+
+
+def map_strips(func, *arrays, out=None, band_rows=STRIP_ROWS, halo=0, dtype=None):
+    """
+    对若干同样行数的数组按条带调用 func(*条带)，适用于只依赖行范围内像素的运算
+
+    :param func: func(*条带) 返回与条带行数相同的结果
+    :param arrays: 输入数组，第0维为行
+    :param out: 输出缓冲区，None时按第一个输入的形状和 dtype 分配
+    :return: out
+    """
+    height = arrays[0].shape[0]
+    if out is None:
+        out = np.empty(arrays[0].shape, dtype=dtype or arrays[0].dtype)
+    return run_strips(lambda y0, y1: func(*(a[y0:y1] for a in arrays)), height, out, band_rows, halo)
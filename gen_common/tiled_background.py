@@ -0,0 +1,83 @@
+import cv2
+import numpy as np
+
+from gen_common.scaled_assets import read_scaled, scaled_size
+
+# 平铺大图的默认尺寸，与相机原图一致
+TILED_WIDTH = 5472
+TILED_HEIGHT = 3648
+
+
+class TiledBackground:
+    """
+    把一张小图看作向右、向下循环平铺的 width x height 虚拟大图，只在需要时生成所请求的窗口
+
+    虚拟大图第 (y, x) 个像素为小图的第 ((y + phase_y) % 小图高, (x + phase_x) % 小图宽) 个像素；
+    phase 为 (0, 0) 时与从左上角开始逐块拼贴的大图完全相同。
+    """
+
+    def __init__(self, tile, width=TILED_WIDTH, height=TILED_HEIGHT, phase=(0, 0)):
+        self.tile = tile
+        self.width = width
+        self.height = height
+        self.phase = (phase[0] % tile.shape[1], phase[1] % tile.shape[0])
+        self._gray_tile = None
+
+    @classmethod
+    def from_file(cls, tile_path, width=TILED_WIDTH, height=TILED_HEIGHT, scale=1):
+        """
+        读取小图作为平铺单元
+
+        :param scale: 缩放比例，小于1时小图和虚拟大图同比例缩小（小图使用缓存的缩小副本）
+        :return: TiledBackground，读取失败时返回None
+        """
+        tile = read_scaled(tile_path, scale)
+        if tile is None:
+            return None
+        width, height = scaled_size(width, height, scale)
+        return cls(tile, width, height)
+
+    @property
+    def shape(self):
+        return (self.height, self.width) + self.tile.shape[2:]
+
+    def with_phase(self, phase_x, phase_y):
+        """返回相位不同、共享同一小图的虚拟大图"""
+        return TiledBackground(self.tile, self.width, self.height, (phase_x, phase_y))
+
+    def window(self, x, y, width, height, tile=None):
+        """
+        生成虚拟大图中左上角为 (x, y)、大小为 width x height 的窗口（新分配的连续数组，可直接修改）
+
+        先把小图循环移位使窗口左上角对齐小图原点，再用 OpenCV 的循环边界一次扩展到窗口大小。
+        """
+        tile = self.tile if tile is None else tile
+        tile_height, tile_width = tile.shape[:2]
+        offset_x = (x + self.phase[0]) % tile_width
+        offset_y = (y + self.phase[1]) % tile_height
+        rolled = np.roll(tile, (-offset_y, -offset_x), axis=(0, 1))
+        bottom = max(0, height - tile_height)
+        right = max(0, width - tile_width)
+        if bottom or right:
+            rolled = cv2.copyMakeBorder(rolled, 0, bottom, 0, right, cv2.BORDER_WRAP)
+        return np.ascontiguousarray(rolled[:height, :width])
+
+    def materialize(self):
+        """生成整幅虚拟大图"""
+        return self.window(0, 0, self.width, self.height)
+
+    def generate(self, seed, grayscale=False):
+        """
+        按种子随机选取相位并生成整幅背景，与 ProceduralBackground.generate 接口相同
+
+        :param seed: 随机种子，相同种子得到相同相位
+        :param grayscale: 为True时返回单通道（小图只转换一次）
+        """
+        rng = np.random.default_rng(seed)
+        tile_height, tile_width = self.tile.shape[:2]
+        background = self.with_phase(int(rng.integers(tile_width)), int(rng.integers(tile_height)))
+        if not grayscale or self.tile.ndim == 2:
+            return background.materialize()
+        if self._gray_tile is None:
+            self._gray_tile = cv2.cvtColor(self.tile, cv2.COLOR_BGR2GRAY)
+        return background.window(0, 0, self.width, self.height, self._gray_tile)
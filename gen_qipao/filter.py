@@ -1,9 +1,13 @@
 import cv2
-import numpy as np
 import os
 import argparse
+import sys
+from concurrent.futures import ProcessPoolExecutor
 
-def apply_gray_mask_with_fill(image_path, output_path, lower_threshold, upper_threshold):
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from gen_common.gray_mask import threshold_lut, gray_mask_fill, keep_masked
+
+def apply_gray_mask_with_fill(image_path, output_path, lower_threshold, upper_threshold, band_rows=0, lut=None):
     """
     对灰度图片应用灰色掩模，保留阈值范围内部分，并填充不规则环形内部。
     
@@ -11,6 +15,8 @@ def apply_gray_mask_with_fill(image_path, output_path, lower_threshold, upper_th
     :param output_path: 输出图片的保存路径
     :param lower_threshold: 灰度下限阈值
     :param upper_threshold: 灰度上限阈值
+    :param band_rows: 大于0时查表和保留灰度两步按水平条带处理，孔洞填充仍在整幅掩模上进行
+    :param lut: 预先计算的阈值查找表，None时按阈值计算
     """
     # 读取灰度图片
     image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
@@ -18,28 +24,28 @@ def apply_gray_mask_with_fill(image_path, output_path, lower_threshold, upper_th
         print(f"无法读取图片: {image_path}")
         return False
 
-    # 应用灰度掩模，保留在下限阈值到上限阈值之间的像素
-    print(upper_threshold, lower_threshold)
-    masked_image = np.where((image >= upper_threshold) | (image <= lower_threshold), image, 0).astype(np.uint8)
-
-    # 找到轮廓
-    contours, _ = cv2.findContours(masked_image, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-    # 创建一个空白图像用于绘制填充后的轮廓
-    filled_image = np.zeros_like(image)
+    if lut is None:
+        lut = threshold_lut(lower_threshold, upper_threshold)
 
-    # 填充轮廓内部
-    cv2.drawContours(filled_image, contours, -1, (255), thickness=cv2.FILLED)
+    # 查表得到阈值掩模（保留 >= 上限或 <= 下限的像素），并填充外轮廓内部的孔洞
+    filled_image = gray_mask_fill(image, lut, band_rows)
 
-    # 在填充的区域内保留原始灰度值
-    result_image = np.where(filled_image == 255, image, 0)
+    # 在填充的区域内保留原始灰度值，结果原地写回填充图
+    result_image = keep_masked(image, filled_image, band_rows)
 
     # 保存处理后的图片
     cv2.imwrite(output_path, result_image)
     print(f"处理后的图片已保存到: {output_path}")
     return True
 
-def process_folder(input_folder, output_folder, lower_threshold, upper_threshold):
+def _init_worker():
+    # 每个进程只处理一张图，OpenCV内部不再开线程
+    cv2.setNumThreads(1)
+
+def _filter_task(task):
+    return apply_gray_mask_with_fill(*task)
+
+def process_folder(input_folder, output_folder, lower_threshold, upper_threshold, band_rows=0, workers=1):
     """
     处理文件夹中的所有图像，应用灰度掩模和填充，并在输出文件夹中保存结果。
     
@@ -47,6 +53,8 @@ def process_folder(input_folder, output_folder, lower_threshold, upper_threshold
     :param output_folder: 输出文件夹路径
     :param lower_threshold: 灰度下限阈值
     :param upper_threshold: 灰度上限阈值
+    :param band_rows: 大于0时按水平条带处理逐像素运算
+    :param workers: 并行处理的进程数
     """
     # 确保输出文件夹存在
     os.makedirs(output_folder, exist_ok=True)
@@ -58,9 +66,11 @@ def process_folder(input_folder, output_folder, lower_threshold, upper_threshold
         print(f"在文件夹 {input_folder} 中没有找到图像文件")
         return
     
-    processed_count = 0
-    failed_count = 0
-    
+    # 阈值查找表只计算一次，随任务分发给各进程
+    print(f"灰度阈值: 下限 {lower_threshold}, 上限 {upper_threshold}")
+    lut = threshold_lut(lower_threshold, upper_threshold)
+
+    tasks = []
     for image_file in image_files:
         input_path = os.path.join(input_folder, image_file)
         
@@ -69,16 +79,19 @@ def process_folder(input_folder, output_folder, lower_threshold, upper_threshold
         # output_filename = f"{filename}_filter{ext}"
         output_filename = f"{filename}{ext}"
         output_path = os.path.join(output_folder, output_filename)
-        
-        print(f"正在处理: {input_path}")
-        
-        success = apply_gray_mask_with_fill(input_path, output_path, lower_threshold, upper_threshold)
-        
-        if success:
-            processed_count += 1
-        else:
-            failed_count += 1
+        tasks.append((input_path, output_path, lower_threshold, upper_threshold, band_rows, lut))
+    
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+            results = list(executor.map(_filter_task, tasks))
+    else:
+        results = []
+        for task in tasks:
+            print(f"正在处理: {task[0]}")
+            results.append(_filter_task(task))
     
+    processed_count = sum(results)
+    failed_count = len(results) - processed_count
     print(f"\n处理完成! 成功处理: {processed_count} 张图像, 失败: {failed_count} 张图像")
 
 def main():
@@ -87,10 +100,12 @@ def main():
     parser.add_argument('--output_folder', type=str, default="/media/qinyh/KINGSTON/GenData/qipao/qipao_filter", help='输出图像文件夹路径')
     parser.add_argument('--lower_threshold', type=int, default=80, help='灰度下限阈值')
     parser.add_argument('--upper_threshold', type=int, default=100, help='灰度上限阈值')
+    parser.add_argument('--band_rows', type=int, default=0, help='按水平条带逐段处理时每条带的行数（如256），0表示整幅处理')
+    parser.add_argument('--workers', type=int, default=1, help='并行处理的进程数')
     
     args = parser.parse_args()
     
-    process_folder(args.input_folder, args.output_folder, args.lower_threshold, args.upper_threshold)
+    process_folder(args.input_folder, args.output_folder, args.lower_threshold, args.upper_threshold, args.band_rows, args.workers)
 
 if __name__ == "__main__":
     main()
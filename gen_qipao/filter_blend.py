@@ -0,0 +1,105 @@
+import cv2
+import os
+import argparse
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from gen_common.filter_blend import FilterBlend
+
+def filter_blend_image(image_path, output_path, stage):
+    """
+    读取一张合成图像，在内存中过滤、填充、与背景拼接并模糊后只保存一次
+
+    结果与依次运行 filter.py 和 blend_with_background.py 相同（中间结果为 PNG 时），
+    但不再写出和读回 qipao_filter 中间图像。
+
+    :param image_path: 合成图像路径
+    :param output_path: 拼接后的图片保存路径
+    :param stage: FilterBlend 处理阶段
+    :return: 操作是否成功
+    """
+    image = cv2.imread(image_path, cv2.IMREAD_UNCHANGED)
+    if image is None:
+        print(f"无法读取图片: {image_path}")
+        return False
+    if image.ndim == 3 and image.shape[2] == 4:
+        image = cv2.cvtColor(image, cv2.COLOR_BGRA2BGR)
+
+    blended_image = stage(image)
+    if blended_image is None:
+        return False
+
+    cv2.imwrite(output_path, blended_image)
+    print(f"拼接后的图片已保存到: {output_path}")
+    return True
+
+def _init_worker():
+    # 每个进程只处理一张图，OpenCV内部不再开线程
+    cv2.setNumThreads(1)
+
+def _filter_blend_task(task):
+    return filter_blend_image(*task)
+
+def process_folder(input_folder, background_image_path, output_folder, lower_threshold, upper_threshold, band_rows=0, workers=1, scale=1):
+    """
+    对文件夹中的所有合成图像执行过滤和拼接，并将结果保存到输出文件夹。
+
+    :param input_folder: 输入图像文件夹路径（random_make.py 的输出）
+    :param background_image_path: 背景图像路径
+    :param output_folder: 输出图像文件夹路径
+    :param lower_threshold: 灰度下限阈值
+    :param upper_threshold: 灰度上限阈值
+    :param band_rows: 大于0时按水平条带处理
+    :param workers: 并行处理的进程数，每个进程各自缓存缩放后的背景
+    :param scale: 输入按 random_make.py --scale 缩小生成时的缩放比例，高斯核同比例缩小
+    """
+    # 确保输出文件夹存在
+    os.makedirs(output_folder, exist_ok=True)
+
+    # 获取输入文件夹中的所有图像文件
+    image_files = [f for f in os.listdir(input_folder) if f.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff'))]
+
+    if not image_files:
+        print(f"在文件夹 {input_folder} 中没有找到图像文件")
+        return
+
+    print(f"灰度阈值: 下限 {lower_threshold}, 上限 {upper_threshold}")
+    stage = FilterBlend(background_image_path, lower_threshold, upper_threshold, band_rows, scale)
+
+    # 输出文件名与输入相同
+    tasks = [(os.path.join(input_folder, image_file), os.path.join(output_folder, image_file), stage)
+             for image_file in image_files]
+
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+            results = list(executor.map(_filter_blend_task, tasks, chunksize=max(1, len(tasks) // (workers * 4))))
+    else:
+        results = []
+        for task in tasks:
+            print(f"正在处理: {task[0]}")
+            results.append(_filter_blend_task(task))
+
+    processed_count = sum(results)
+    failed_count = len(results) - processed_count
+
+    print(f"\n处理完成! 成功处理: {processed_count} 张图像, 失败: {failed_count} 张图像")
+
+def main():
+    parser = argparse.ArgumentParser(description='对合成图像应用灰度掩模和填充，并与背景图片拼接（一次完成 filter.py 和 blend_with_background.py）')
+    parser.add_argument('--input_folder', type=str, default="/media/qinyh/KINGSTON/GenData/qipao/qipao_random_make", help='输入图像文件夹路径')
+    parser.add_argument('--background', type=str, default="gen_qipao/Background.bmp", help='背景图像路径')
+    parser.add_argument('--output_folder', type=str, default="/media/qinyh/KINGSTON/GenData/qipao/qipao_blend", help='输出图像文件夹路径')
+    parser.add_argument('--lower_threshold', type=int, default=80, help='灰度下限阈值')
+    parser.add_argument('--upper_threshold', type=int, default=100, help='灰度上限阈值')
+    parser.add_argument('--band_rows', type=int, default=0, help='按水平条带逐段处理时每条带的行数（如256），0表示整幅处理')
+    parser.add_argument('--workers', type=int, default=1, help='并行处理的进程数')
+    parser.add_argument('--scale', type=float, default=1.0, help='输入图像生成时的缩放比例（与 random_make.py --scale 相同），平滑的高斯核同比例缩小')
+
+    args = parser.parse_args()
+
+    process_folder(args.input_folder, args.background, args.output_folder,
+                   args.lower_threshold, args.upper_threshold, args.band_rows, args.workers, args.scale)
+
+if __name__ == "__main__":
+    main()
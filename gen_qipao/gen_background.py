@@ -1,59 +1,55 @@
 import cv2
 import numpy as np
-from scipy.stats import norm
 import os
-
-def process_images_and_generate_sample(img_folder, output_path, height=3648, width=5472):
+import argparse
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from gen_common.border_stats import list_images, folder_border_histogram, trimmed_stats
+from gen_common.stats_cache import open_cache
+
+def fit_border_stats(img_folder, workers=1, use_cache=True):
+    """
+    统计文件夹中所有图片边框像素的逐通道直方图，并拟合去掉 3%-97% 分位数之外像素后的高斯分布
+
+    :param img_folder: 图片文件夹路径
+    :param workers: 并行统计的进程数
+    :param use_cache: 是否使用图片文件夹中的统计缓存，已统计过的图片不再解码
+    :return: {'R': (均值, 标准差), 'G': ..., 'B': ...}，没有可用图片时返回None
+    """
     # 获取文件夹中的所有图片路径
-    img_files = [os.path.join(img_folder, f) for f in os.listdir(img_folder) if f.endswith(('.png', '.jpg', '.bmp'))]
+    img_files = list_images(img_folder)
 
     if not img_files:
         print(f"文件夹 {img_folder} 中没有找到图片！")
+        return None
+
+    # 单次流式遍历，只累加每个通道的256级直方图
+    cache = open_cache(img_folder, use_cache)
+    hist, failed = folder_border_histogram(img_files, workers=workers, cache=cache)
+    if cache is not None:
+        cache.close()
+    for img_path in failed:
+        print(f"无法读取图像：{img_path}")
+    if hist is None:
+        return None
+
+    # OpenCV 通道顺序为 BGR
+    return {
+        'R': trimmed_stats(hist[2]),
+        'G': trimmed_stats(hist[1]),
+        'B': trimmed_stats(hist[0]),
+    }
+
+def process_images_and_generate_sample(img_folder, output_path, height=3648, width=5472, workers=1, use_cache=True):
+    # 拟合各通道边框像素的高斯分布
+    stats = fit_border_stats(img_folder, workers, use_cache)
+    if stats is None:
         return
 
-    # 存储所有图片的边框像素值
-    all_border_pixels = []
-
-    for img_path in img_files:
-        # 读取图像
-        image = cv2.imread(img_path)
-        if image is None:
-            print(f"无法读取图像：{img_path}")
-            continue
-
-        # 获取图像边框像素值
-        border_pixels = []
-        img_height, img_width, _ = image.shape
-
-        # 提取边框像素值
-        border_pixels.extend(image[0, :, :].tolist())  # 上边框
-        border_pixels.extend(image[-1, :, :].tolist())  # 下边框
-        border_pixels.extend(image[:, 0, :].tolist())  # 左边框
-        border_pixels.extend(image[:, -1, :].tolist())  # 右边框
-
-        all_border_pixels.extend(border_pixels)
-
-    all_border_pixels = np.array(all_border_pixels)
-
-    # 分离 R、G、B 通道
-    R = all_border_pixels[:, 2]
-    G = all_border_pixels[:, 1]
-    B = all_border_pixels[:, 0]
-
-    # 筛选 1%-99% 分位数范围内的值
-    def filter_percentile(channel):
-        lower = np.percentile(channel, 3)
-        upper = np.percentile(channel, 97)
-        return channel[(channel >= lower) & (channel <= upper)]
-
-    R_filtered = filter_percentile(R)
-    G_filtered = filter_percentile(G)
-    B_filtered = filter_percentile(B)
-
-    # 拟合高斯分布
-    R_mean, R_std = norm.fit(R_filtered)
-    G_mean, G_std = norm.fit(G_filtered)
-    B_mean, B_std = norm.fit(B_filtered)
+    R_mean, R_std = stats['R']
+    G_mean, G_std = stats['G']
+    B_mean, B_std = stats['B']
 
     print(f"R通道均值: {R_mean}, 标准差: {R_std}")
     print(f"G通道均值: {G_mean}, 标准差: {G_std}")
@@ -71,7 +67,19 @@ def process_images_and_generate_sample(img_folder, output_path, height=3648, wid
     cv2.imwrite(output_path, generated_image)
     print(f"生成的图像已保存到：{output_path}")
 
-# 使用示例
-img_folder = "gen_qipao/qipao_matched"  # 替换为包含图片的文件夹路径
-output_path = "gen_qipao/Background.bmp"  # 替换为输出图像路径
-process_images_and_generate_sample(img_folder, output_path)
\ No newline at end of file
+def main():
+    parser = argparse.ArgumentParser(description='按图片边框像素的高斯分布生成背景图')
+    parser.add_argument('--img_folder', type=str, default="gen_qipao/qipao_matched", help='包含图片的文件夹路径')
+    parser.add_argument('--output_path', type=str, default="gen_qipao/Background.bmp", help='输出图像路径')
+    parser.add_argument('--height', type=int, default=3648, help='生成图像高度')
+    parser.add_argument('--width', type=int, default=5472, help='生成图像宽度')
+    parser.add_argument('--workers', type=int, default=1, help='并行统计直方图的进程数')
+    parser.add_argument('--no_stats_cache', action='store_true', help='不使用图片文件夹中的统计缓存，重新解码所有图片')
+
+    args = parser.parse_args()
+
+    process_images_and_generate_sample(args.img_folder, args.output_path, args.height, args.width, args.workers,
+                                       not args.no_stats_cache)
+
+if __name__ == "__main__":
+    main()
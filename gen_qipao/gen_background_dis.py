@@ -1,57 +1,96 @@
 import cv2
 import numpy as np
 import os
+import argparse
+import sys
 
-def process_images_and_generate_sample(img_folder, output_path, height=3648, width=5472):
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from gen_common.border_stats import list_images, folder_border_histogram, inverse_cdf_lut, sample_lut
+from gen_common.stats_cache import open_cache
+
+# 通道名与 OpenCV BGR 下标的对应
+CHANNEL_INDEX = {'B': 0, 'G': 1, 'R': 2}
+
+def build_samplers(img_folder, channels=('R',), workers=1, use_cache=True):
+    """
+    统计边框像素的逐通道直方图，并为需要的通道构造逆CDF查找表
+
+    :param img_folder: 图片文件夹路径
+    :param channels: 需要采样的通道
+    :param workers: 并行统计的进程数
+    :param use_cache: 是否使用图片文件夹中的统计缓存，已统计过的图片不再解码
+    :return: {通道名: 查找表}，没有可用图片时返回None
+    """
     # 获取文件夹中的所有图片路径
-    img_files = [os.path.join(img_folder, f) for f in os.listdir(img_folder) if f.endswith(('.png', '.jpg', '.bmp'))]
+    img_files = list_images(img_folder)
 
     if not img_files:
         print(f"文件夹 {img_folder} 中没有找到图片！")
-        return
+        return None
+
+    # 单次流式遍历，只累加需要采样的通道的256级直方图
+    indices = tuple(CHANNEL_INDEX[channel] for channel in channels)
+    cache = open_cache(img_folder, use_cache)
+    hist, failed = folder_border_histogram(img_files, workers=workers, cache=cache, channels=indices)
+    if cache is not None:
+        cache.close()
+    for img_path in failed:
+        print(f"无法读取图像：{img_path}")
+    if hist is None:
+        return None
 
-    # 存储所有图片的边框像素值
-    all_border_pixels = []
+    # 直方图的行与 channels 一一对应
+    return {channel: inverse_cdf_lut(hist[i]) for i, channel in enumerate(channels)}
 
-    for img_path in img_files:
-        # 读取图像
-        image = cv2.imread(img_path)
-        if image is None:
-            print(f"无法读取图像：{img_path}")
-            continue
+def generate_background(luts, rng, height=3648, width=5472):
+    """
+    按边框像素的经验分布逐像素独立采样一张灰度背景（三个通道相同）
 
-        # 获取图像边框像素值
-        border_pixels = []
-        img_height, img_width, _ = image.shape
+    :param luts: build_samplers 返回的查找表，使用 R 通道
+    :param rng: numpy.random.Generator
+    :return: (height, width, 3) 的 uint8 图像
+    """
+    # 只需要 R 通道，合并为三通道灰度图
+    R_sampled = sample_lut(luts['R'], (height, width), rng)
+    return cv2.merge([R_sampled, R_sampled, R_sampled])
 
-        # 提取边框像素值
-        border_pixels.extend(image[0, :, :].tolist())  # 上边框
-        border_pixels.extend(image[-1, :, :].tolist())  # 下边框
-        border_pixels.extend(image[:, 0, :].tolist())  # 左边框
-        border_pixels.extend(image[:, -1, :].tolist())  # 右边框
+def output_paths(output_path, count):
+    """生成多张时在文件名后加序号"""
+    if count == 1:
+        return [output_path]
+    base, ext = os.path.splitext(output_path)
+    return [f"{base}_{i:03d}{ext}" for i in range(count)]
 
-        all_border_pixels.extend(border_pixels)
+def process_images_and_generate_sample(img_folder, output_path, height=3648, width=5472, count=1, seed=None, workers=1,
+                                       use_cache=True):
+    luts = build_samplers(img_folder, workers=workers, use_cache=use_cache)
+    if luts is None:
+        return
 
-    all_border_pixels = np.array(all_border_pixels)
+    # 查找表只构造一次，连续生成多张背景
+    rng = np.random.default_rng(seed)
+    for path in output_paths(output_path, count):
+        generated_image = generate_background(luts, rng, height, width)
 
-    # 分离 R、G、B 通道
-    R = all_border_pixels[:, 2]
-    G = all_border_pixels[:, 1]
-    B = all_border_pixels[:, 0]
+        # 保存生成的图像
+        cv2.imwrite(path, generated_image)
+        print(f"生成的图像已保存到：{path}")
 
-    # 随机从边框像素中选取值构建背景图
-    R_sampled = np.random.choice(R, size=(height, width)).astype(np.uint8)
-    G_sampled = np.random.choice(G, size=(height, width)).astype(np.uint8)
-    B_sampled = np.random.choice(B, size=(height, width)).astype(np.uint8)
+def main():
+    parser = argparse.ArgumentParser(description='按图片边框像素的经验分布随机采样生成背景图')
+    parser.add_argument('--img_folder', type=str, default="photo_processing/qipao", help='包含图片的文件夹路径')
+    parser.add_argument('--output_path', type=str, default="photo_processing/Background_dis.bmp", help='输出图像路径，生成多张时自动加序号')
+    parser.add_argument('--height', type=int, default=3648, help='生成图像高度')
+    parser.add_argument('--width', type=int, default=5472, help='生成图像宽度')
+    parser.add_argument('--count', type=int, default=1, help='生成背景的数量')
+    parser.add_argument('--seed', type=int, default=None, help='随机种子')
+    parser.add_argument('--workers', type=int, default=1, help='并行统计直方图的进程数')
+    parser.add_argument('--no_stats_cache', action='store_true', help='不使用图片文件夹中的统计缓存，重新解码所有图片')
 
-    # 合并通道(灰度图)
-    generated_image = cv2.merge([R_sampled, R_sampled, R_sampled])
+    args = parser.parse_args()
 
-    # 保存生成的图像
-    cv2.imwrite(output_path, generated_image)
-    print(f"生成的图像已保存到：{output_path}")
+    process_images_and_generate_sample(args.img_folder, args.output_path, args.height, args.width,
+                                       args.count, args.seed, args.workers, not args.no_stats_cache)
 
-# 使用示例
-img_folder = "photo_processing/qipao"  # 替换为包含图片的文件夹路径
-output_path = "photo_processing/Background_dis.bmp"  # 替换为输出图像路径
-process_images_and_generate_sample(img_folder, output_path)
\ No newline at end of file
+if __name__ == "__main__":
+    main()
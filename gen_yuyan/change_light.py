@@ -1,104 +1,68 @@
-import cv2
-import numpy as np
-import random
 import os
 import argparse
+import sys
 
-def simulate_lighting(image_path, output_path, max_lights=10):
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from gen_common.photometric import simulate_image, process_folder as process_photometric_folder
+
+# 光源强度范围
+LIGHT_INTENSITY = (10, 20)
+
+def simulate_lighting(image_path, output_path, max_lights=10, field_scale=1, field_bank=None, low_memory=False,
+                      band_rows=0):
     """
-    在灰度图上模拟多个光源的光线变化。
+    在灰度图上模拟多个光源的光线变化（由 gen_common/photometric.py 实现，只加光照）。
     
     :param image_path: 输入灰度图片的路径
     :param output_path: 输出图片的保存路径
     :param max_lights: 最大光源数量
+    :param field_scale: 光照场粗网格的缩小倍数，大于1时在粗网格上计算后双线性插值
+    :param field_bank: 可选的 FieldBank，给定时直接从场库取光照场，不再逐张计算
+    :param low_memory: 低内存模式，光照场以 uint16 定点数保存并用OpenCV饱和运算作用到图像上
+    :param band_rows: 大于0时按该行数的水平条带逐段处理，峰值内存由条带大小决定
     :return: 操作是否成功
     """
-    # 读取灰度图片
-    image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
-    if image is None:
-        print(f"无法读取图片: {image_path}")
-        return False
-
-    # 获取图片分辨率
-    height, width = image.shape
-
-    # 随机生成光源数量
-    num_lights = random.randint(1, max_lights)
-
-    # 初始化光照掩模
-    light_mask = np.zeros_like(image, dtype=np.float32)
-
-    for _ in range(num_lights):
-        # 随机生成光源参数
-        light_center = (random.randint(0, width), random.randint(0, height))  # 光源中心
-        light_intensity = random.uniform(10, 20)  # 光源强度
-        light_radius = random.uniform(500, 1500)  # 光源半径
-
-        # 创建单个光源的光照掩模
-        y, x = np.ogrid[:height, :width]
-        distance_from_center = np.sqrt((x - light_center[0])**2 + (y - light_center[1])**2)
-        single_light_mask = np.clip(light_intensity * (1 - distance_from_center / light_radius), 0, light_intensity)
-
-        # 累加光源效果
-        light_mask += single_light_mask
+    return simulate_image(image_path, output_path, max_lights=max_lights, max_shadows=0,
+                          light_intensity=LIGHT_INTENSITY, field_scale=field_scale, light_bank=field_bank,
+                          low_memory=low_memory, band_rows=band_rows)
 
-    # 将光照掩模叠加到原始图片
-    lighted_image = cv2.add(image, light_mask.astype(np.uint8))
-
-    # 保存处理后的图片
-    cv2.imwrite(output_path, lighted_image)
-    print(f"模拟光线变化后的图片已保存到: {output_path}")
-    return True
-
-def process_folder(input_folder, output_folder, max_lights=10):
+def process_folder(input_folder, output_folder, max_lights=10, field_scale=1, field_bank_path=None, workers=1, seed=None,
+                   low_memory=False, band_rows=0):
     """
     处理文件夹中的所有图像，应用光照模拟，并将结果保存到输出文件夹。
     
     :param input_folder: 输入图像文件夹路径
     :param output_folder: 输出图像文件夹路径
     :param max_lights: 最大光源数量
+    :param field_scale: 光照场粗网格的缩小倍数
+    :param field_bank_path: 可选的预计算光照场库路径（由 gen_common/field_bank.py 生成）
+    :param workers: 并行处理的进程数
+    :param seed: 总随机种子，每张图像的种子由它和文件名得到，结果与进程数无关
+    :param low_memory: 低内存模式（uint16 定点场）
+    :param band_rows: 大于0时按水平条带逐段处理
     """
-    # 确保输出文件夹存在
-    os.makedirs(output_folder, exist_ok=True)
-    
-    # 获取输入文件夹中的所有图像文件
-    image_files = [f for f in os.listdir(input_folder) if f.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff'))]
-    
-    if not image_files:
-        print(f"在文件夹 {input_folder} 中没有找到图像文件")
-        return
-    
-    processed_count = 0
-    failed_count = 0
-    
-    for image_file in image_files:
-        input_path = os.path.join(input_folder, image_file)
-        
-        # 生成输出文件名（在原文件名的扩展名前添加_light）
-        filename, ext = os.path.splitext(image_file)
-        output_filename = f"{filename}{ext}"
-        output_path = os.path.join(output_folder, output_filename)
-        
-        print(f"正在处理: {input_path}")
-        
-        success = simulate_lighting(input_path, output_path, max_lights)
-        
-        if success:
-            processed_count += 1
-        else:
-            failed_count += 1
-    
-    print(f"\n处理完成! 成功处理: {processed_count} 张图像, 失败: {failed_count} 张图像")
+    # 输出文件名与原文件名相同
+    process_photometric_folder(input_folder, output_folder, suffix='', max_lights=max_lights, max_shadows=0,
+                               light_intensity=LIGHT_INTENSITY, field_scale=field_scale,
+                               light_bank_path=field_bank_path, workers=workers, seed=seed,
+                               low_memory=low_memory, band_rows=band_rows)
 
 def main():
     parser = argparse.ArgumentParser(description='对图像应用光照效果模拟')
     parser.add_argument('--input_folder', type=str, default="/media/qinyh/KINGSTON/GenData/yuyan/yuyan_random_make", help='输入图像文件夹路径')
     parser.add_argument('--output_folder', type=str, default="/media/qinyh/KINGSTON/GenData/yuyan/yuyan_light", help='输出图像文件夹路径')
     parser.add_argument('--max_lights', type=int, default=10, help='最大光源数量')
+    parser.add_argument('--field_scale', type=int, default=1, help='光照场粗网格的缩小倍数（如8），1表示全分辨率计算')
+    parser.add_argument('--field_bank', type=str, default=None, help='预计算的光照场库路径，给定时直接从场库随机取场')
+    parser.add_argument('--workers', type=int, default=1, help='并行处理的进程数')
+    parser.add_argument('--seed', type=int, default=None, help='总随机种子，每张图像的种子由它和文件名得到')
+    parser.add_argument('--low_memory', action='store_true', help='低内存模式：场以 uint16 定点数保存，用OpenCV饱和运算叠加')
+    parser.add_argument('--band_rows', type=int, default=0, help='按水平条带逐段处理时每条带的行数（如256），0表示整幅处理')
     
     args = parser.parse_args()
     
-    process_folder(args.input_folder, args.output_folder, args.max_lights)
+    process_folder(args.input_folder, args.output_folder, args.max_lights, args.field_scale, args.field_bank, args.workers, args.seed,
+                   low_memory=args.low_memory, band_rows=args.band_rows)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
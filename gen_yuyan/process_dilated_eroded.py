@@ -99,7 +99,7 @@ def process_folder(input_folder, kernel_size=5, iterations=2):
 def main():
     parser = argparse.ArgumentParser(description='处理target.png图像，提取橙色部分并进行形态学操作')
     parser.add_argument('--input_folder', type=str, default="/media/qinyh/KINGSTON/MetaData/yuyan_data", help='输入图像文件夹路径')
-    parser.add_argument('--kernel_size', type=int, default=5, help='形态学操作的核大小')
+    parser.add_argument('--kernel_size', type=int, default=5, help='形态学操作的核大小（原分辨率素材上的像素数；random_make.py --scale 缩小时掩码按最近邻缩小，膨胀宽度随之同比例变化）')
     parser.add_argument('--iterations', type=int, default=2, help='腐蚀和膨胀的迭代次数')
     
     args = parser.parse_args()
@@ -1,193 +1,459 @@
 import cv2
 import os
+import sys
 import random
 import numpy as np
 import time
 import argparse
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from datetime import datetime
+from pathlib import Path
 
-def add_multiple_patches_to_background(background_dir, img_folder, num_patches=5, 
-                                       output_dir="gen_qipao/output", output_target_dir="gen_qipao/output_target",
-                                       index=0):
-    # 获取背景文件夹中的所有图片路径
-    background_files = [os.path.join(background_dir, f) for f in os.listdir(background_dir) 
-                      if f.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp'))]
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from gen_common.prefetch import StageTimer, prefetch, BackgroundWriter
+from gen_common.schedule import tier_patch_range, estimate_cost, run_balanced
+from gen_common.annotations import save_annotations
+from gen_common.procedural_background import load_source
+from gen_common.scaled_assets import read_scaled, scaled_gaussian
 
-    if not background_files:
-        print(f"文件夹 {background_dir} 中没有找到背景图片！")
-        return None, None
+def sample_num_patches(index):
+    """根据图像索引所在的档位（少量/中等/大量）随机确定小图数量，超出范围时返回None"""
+    patch_range = tier_patch_range(index)
+    if patch_range is None:
+        return None
+    return random.randint(*patch_range)
 
-    # 随机选择一张背景图片
-    background_path = random.choice(background_files)
-    background = cv2.imread(background_path)
-    
-    if background is None:
-        print(f"无法读取背景图片：{background_path}")
-        return None, None
+def plan_jobs(start_index, runs):
+    """按索引顺序抽取每张图像的小图数量，返回 [(index, num_patches), ...]"""
+    jobs = []
+    for i in range(runs):
+        num_patches = sample_num_patches(start_index + i)
+        if num_patches is None:
+            break
+        jobs.append((start_index + i, num_patches))
+    return jobs
 
-    print(f"已选择背景图片: {os.path.basename(background_path)}")
+def list_background_files(background_dir):
+    """获取背景文件夹中的所有图片路径"""
+    return [os.path.join(background_dir, f) for f in os.listdir(background_dir)
+            if f.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp'))]
 
-    # 获取背景图片的大小
-    bg_height, bg_width, _ = background.shape
-    
-    # 创建一个全黑的目标掩码图像
-    target_mask_all = np.zeros((bg_height, bg_width, 3), dtype=np.uint8)
+def list_patch_files(img_folder):
+    """获取文件夹中的所有小图路径（不包括_target.png）"""
+    return [os.path.join(img_folder, f) for f in os.listdir(img_folder) if f.endswith(('.png')) and not f.endswith(('_target.png', '_process.png'))]
 
-    # 获取文件夹中的所有图片路径（不包括_target.png）
-    img_files = [os.path.join(img_folder, f) for f in os.listdir(img_folder) if f.endswith(('.png')) and not f.endswith(('_target.png', '_process.png'))]
+def read_image(path, grayscale=False, scale=1):
+    """读取背景或小图，灰度模式下只解码单通道；scale 小于1时读取缓存的缩小副本"""
+    return read_scaled(path, scale, cv2.IMREAD_GRAYSCALE if grayscale else cv2.IMREAD_COLOR)
 
-    if not img_files:
-        print(f"文件夹 {img_folder} 中没有找到图片！")
-        return
+def pick_background(background_files, rng, grayscale=False, procedural=None, scale=1):
+    """
+    随机选取一张背景
 
-    # 存储已放置的区域
-    placed_regions = []
+    :param rng: random 模块或 random.Random 实例
+    :param procedural: 可选的 ProceduralBackground，给定时用 rng 抽取种子在内存中生成背景，不读取背景文件
+    :param scale: 缩放比例，小于1时读取缓存的缩小背景（程序化背景在加载时已按比例设定尺寸）
+    :return: (背景路径或名称, 背景图像)
+    """
+    if procedural is not None:
+        seed = rng.getrandbits(64)
+        return f"procedural_{seed:016x}", procedural.generate(seed, grayscale)
+    background_path = rng.choice(background_files)
+    return background_path, read_image(background_path, grayscale, scale)
+
+def procedural_source(args):
+    """按命令行参数加载程序化背景（每个进程只加载一次），未指定统计文件时返回None"""
+    if not args.procedural_stats:
+        return None
+    return load_source(args.procedural_stats, args.procedural_mode, args.scale)
+
+def export_image(image, export_bgr=False):
+    """保存前按需将单通道图像扩展为3通道"""
+    if export_bgr and image.ndim == 2:
+        return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+    return image
+
+def load_patch(img_folder, img_path, grayscale=False, scale=1):
+    """
+    读取小图及其对应的掩码和目标图
+
+    :param scale: 缩放比例，小于1时读取缓存的缩小小图和掩码（掩码用最近邻插值）
+    :return: (patch_id, img, target_mask, target_img)，读取失败时返回None
+    """
+    img = read_image(img_path, grayscale, scale)
+
+    # 获取对应的_target.png文件路径
+    base_name = os.path.splitext(os.path.basename(img_path))[0]
+    target_file = os.path.join(img_folder, f"{base_name}_target.png")
+    target_file_2 = os.path.join(img_folder, f"{base_name}_target_process.png")
+
+    target_mask = read_scaled(target_file_2, scale, mask=True)
+
+    if target_mask is None:
+        print(f"无法读取对应的target图像：{target_file}")
+        return None
+
+    if img is None:
+        print(f"无法读取图片：{img_path}")
+        return None
+
+    # 确保图像和掩码大小相同
+    if img.shape[:2] != target_mask.shape[:2]:
+        print(f"图像和掩码大小不一致: {img_path}, {target_file}")
+        return None
+
+    # 检查对应的目标文件是否存在
+    if not os.path.exists(target_file):
+        print(f"警告：未找到对应的目标文件： {target_file}")
+        return None
+
+    target_img = read_scaled(target_file, scale, mask=True)
+
+    if target_img is None:
+        print(f"无法读取图片：{img_path} 或 {target_file}")
+        return None
+
+    return base_name, img, target_mask, target_img
 
-    def is_overlapping(x, y, width, height):
-        """检查新区域是否与已放置的区域重叠"""
-        for px, py, pw, ph in placed_regions:
-            if not (x + width <= px or px + pw <= x or y + height <= py or py + ph <= y):
-                return True
-        return False
+def is_overlapping(placed_regions, x, y, width, height):
+    """检查新区域是否与已放置的区域重叠"""
+    for px, py, pw, ph in placed_regions:
+        if not (x + width <= px or px + pw <= x or y + height <= py or py + ph <= y):
+            return True
+    return False
 
+def paste_patches(background, target_mask_all, placements, paste_workers=0):
+    """
+    将所有小图按掩码粘贴到背景上，并写入目标掩码
+
+    :param placements: [(x, y, patch_id, img, target_mask, target_img), ...]，区域互不重叠
+    :param paste_workers: 并行粘贴的线程数，0或1表示顺序粘贴
+    """
+    def paste_patch(placement):
+        x, y, _, img, target_mask, target_img = placement
+        img_height, img_width = img.shape[:2]
+
+        # 获取背景中要放置图像的区域（视图，直接修改背景）
+        bg_patch = background[y:y + img_height, x:x + img_width]
+
+        # 检测黑色区域（所有通道接近0）
+        # 像素被认为是黑色的条件：所有通道值都小于阈值（例如30）
+        black_threshold = 30
+        is_black = np.all(target_mask < black_threshold, axis=2)
+
+        # 将黑色区域设为False（不保留），其他区域为True（保留）
+        orange_mask = np.logical_not(is_black)
+
+        # 只在掩码为True的地方使用原图像，其他地方保留背景
+        np.copyto(bg_patch, img, where=orange_mask if img.ndim == 2 else orange_mask[:, :, None])
+
+        # 放置对应的目标图片到黑色掩码图上
+        target_mask_all[y:y + img_height, x:x + img_width] = target_img
+
+    # NumPy 在拷贝时会释放GIL，互不重叠的区域可以并行写入
+    if paste_workers > 1 and len(placements) > 1:
+        with ThreadPoolExecutor(max_workers=paste_workers) as executor:
+            list(executor.map(paste_patch, placements))
+    else:
+        for placement in placements:
+            paste_patch(placement)
+
+def output_paths(output_dir, output_target_dir, index):
+    """使用索引作为文件名"""
+    output_path = os.path.join(output_dir, f"yuyan_{index}.png")
+    target_output_path = os.path.join(output_target_dir, f"yuyan_target_{index}.png")
+    return output_path, target_output_path
+
+def write_annotations(target_output_path, output_path, target_mask, placements, annotation_format):
+    """根据放置信息直接生成实例标注旁路文件，无需再对整图掩码做连通域分析"""
+    bg_height, bg_width = target_mask.shape[:2]
+    # 每个放置的最后一项都是对应的目标图，非黑色像素即为该实例
+    instances = [(placement[0], placement[1], placement[2], np.any(placement[-1] > 0, axis=2)) for placement in placements]
+    annotation_path = save_annotations(target_output_path, output_path, bg_height, bg_width, 'yuyan', instances, annotation_format)
+    print(f"实例标注已保存为 {annotation_path}")
+
+def place_patches(img_folder, img_files, num_patches, bg_width, bg_height, rng, grayscale=False, scale=1):
+    """
+    随机选择小图并为每张选择互不重叠的位置，串行和流水线生成共用，随机数的使用顺序完全相同
+
+    每次尝试都重新随机选择一张小图，放不下的大图会被换成别的小图，而不是在同一张上反复尝试。
+
+    :param rng: random 模块（串行）或本张图像专用的 random.Random（流水线）
+    :return: [(x, y, patch_id, img, target_mask, target_img), ...]
+    """
+    placed_regions = []
+    placements = []
     for _ in range(num_patches):
         for _ in range(100):  # 尝试最多100次找到一个不重叠的位置
             # 随机选择一张图片
-            img_path = random.choice(img_files)
-            img = cv2.imread(img_path)
-
-            # 获取对应的_target.png文件路径
-            base_name = os.path.splitext(os.path.basename(img_path))[0]
-            # print(base_name)
-            # exit(0)
-            target_file = os.path.join(img_folder, f"{base_name}_target.png")
-            target_file_2 = os.path.join(img_folder, f"{base_name}_target_process.png")
-
-            target_mask = cv2.imread(target_file_2)
-            
-            if target_mask is None:
-                print(f"无法读取对应的target图像：{target_file}")
-                continue
-                
-            # 确保图像和掩码大小相同
-            if img.shape != target_mask.shape:
-                print(f"图像和掩码大小不一致: {img_path}, {target_file}")
-                continue
-            
-            # 检查对应的目标文件是否存在
-            if not os.path.exists(target_file):
-                print(f"警告：未找到对应的目标文件： {target_file}")
+            patch = load_patch(img_folder, rng.choice(img_files), grayscale, scale)
+            if patch is None:
                 continue
-                
-            target_img = cv2.imread(target_file)
+            patch_id, img, target_mask, target_img = patch
 
-            if img is None or target_img is None:
-                print(f"无法读取图片：{img_path} 或 {target_file}")
-                continue
-
-            img_height, img_width, _ = img.shape
+            img_height, img_width = img.shape[:2]
 
             # 随机生成一个合适的位置
-            random_x = random.randint(0, bg_width - img_width)
-            random_y = random.randint(0, bg_height - img_height)
+            random_x = rng.randint(0, bg_width - img_width)
+            random_y = rng.randint(0, bg_height - img_height)
 
             # 检查是否与已放置的区域重叠
-            if not is_overlapping(random_x, random_y, img_width, img_height):
-                # 获取背景中要放置图像的区域
-                bg_patch = background[random_y:random_y + img_height, random_x:random_x + img_width]
-                
-                # 创建掩码，黑色像素表示不保留的区域
-                orange_mask = np.ones_like(target_mask[:,:,0], dtype=bool)
-                                
-                # 检测黑色区域（所有通道接近0）
-                # 像素被认为是黑色的条件：所有通道值都小于阈值（例如30）
-                black_threshold = 30
-                is_black = np.logical_and(
-                    np.logical_and(target_mask[:,:,0] < black_threshold, target_mask[:,:,1] < black_threshold),
-                    target_mask[:,:,2] < black_threshold
-                )
-
-                # 将黑色区域设为False（不保留），其他区域为True（保留）
-                orange_mask = np.logical_not(is_black)
-                
-                # 创建新的合成图像，只在掩码为True的地方使用原图像，其他地方保留背景
-                for i in range(img_height):
-                    for j in range(img_width):
-                        if orange_mask[i, j]:
-                            bg_patch[i, j] = img[i, j]
-                
-                # 将修改后的区域放回背景
-                background[random_y:random_y + img_height, random_x:random_x + img_width] = bg_patch
-                # # 放置小图片到背景上
-                # background[random_y:random_y + img_height, random_x:random_x + img_width] = img
-                # 放置对应的目标图片到黑色掩码图上
-                target_mask_all[random_y:random_y + img_height, random_x:random_x + img_width] = target_img
+            if not is_overlapping(placed_regions, random_x, random_y, img_width, img_height):
+                placements.append((random_x, random_y, patch_id, img, target_mask, target_img))
                 placed_regions.append((random_x, random_y, img_width, img_height))
                 break
+    return placements
+
+def add_multiple_patches_to_background(background_dir, img_folder, num_patches=5,
+                                       output_dir="gen_qipao/output", output_target_dir="gen_qipao/output_target",
+                                       index=0, paste_workers=0, annotation_format=None,
+                                       grayscale=False, export_bgr=False, procedural=None, scale=1):
+    background_files = list_background_files(background_dir) if procedural is None else []
+
+    if procedural is None and not background_files:
+        print(f"文件夹 {background_dir} 中没有找到背景图片！")
+        return None, None
+
+    # 随机选择一张背景图片（或按背景统计程序化生成）
+    background_path, background = pick_background(background_files, random, grayscale, procedural, scale)
+
+    if background is None:
+        print(f"无法读取背景图片：{background_path}")
+        return None, None
+
+    print(f"已选择背景图片: {os.path.basename(background_path)}")
+
+    # 获取背景图片的大小
+    bg_height, bg_width = background.shape[:2]
+
+    # 创建一个全黑的目标掩码图像
+    target_mask_all = np.zeros((bg_height, bg_width, 3), dtype=np.uint8)
+
+    img_files = list_patch_files(img_folder)
+
+    if not img_files:
+        print(f"文件夹 {img_folder} 中没有找到图片！")
+        return None, None
+
+    # 先确定全部放置方案，再统一粘贴（放置区域互不重叠，粘贴顺序不影响结果）
+    placements = place_patches(img_folder, img_files, num_patches, bg_width, bg_height, random, grayscale, scale)
+
+    paste_patches(background, target_mask_all, placements, paste_workers)
 
     # 确保输出目录存在
     os.makedirs(output_dir, exist_ok=True)
     os.makedirs(output_target_dir, exist_ok=True)
-    
-    # # 使用当前时间戳作为文件名，精确到毫秒
-    # timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-    # output_path = os.path.join(output_dir, f"{timestamp}_yuyan.png")
-    # target_output_path = os.path.join(output_target_dir, f"{timestamp}_yuyan_target.png")
 
-    # 使用索引作为文件名
-    output_path = os.path.join(output_dir, f"yuyan_{index}.png")
-    target_output_path = os.path.join(output_target_dir, f"yuyan_target_{index}.png")
+    output_path, target_output_path = output_paths(output_dir, output_target_dir, index)
 
-    # 对生成的图像进行平滑处理（高斯模糊）
-    smoothed_background = cv2.GaussianBlur(background, (9, 9), 0)
-    
-    cv2.imwrite(output_path, smoothed_background)
+    # 对生成的图像进行平滑处理（高斯模糊，缩小时核同比例缩小）
+    ksize, sigma = scaled_gaussian(9, scale)
+    smoothed_background = cv2.GaussianBlur(background, (ksize, ksize), sigma)
+
+    cv2.imwrite(output_path, export_image(smoothed_background, export_bgr))
     cv2.imwrite(target_output_path, target_mask_all)
+    if annotation_format:
+        write_annotations(target_output_path, output_path, target_mask_all, placements, annotation_format)
     print(f"图像已保存为 {output_path}")
     print(f"目标掩码已保存为 {target_output_path}")
     return output_path, target_output_path
 
+def load_frame_inputs(background_files, img_files, img_folder, num_patches, rng, grayscale=False, procedural=None, scale=1):
+    """
+    流水线的预取阶段：解码一张随机背景，随机选择小图并确定互不重叠的放置位置
+
+    放置方案只依赖小图尺寸和随机数，与串行生成使用同一个 place_patches，结果与串行模式一致。
+
+    :param rng: 本张图像专用的 random.Random，保证后台线程与主线程互不干扰
+    :param procedural: 可选的 ProceduralBackground，给定时在内存中生成背景
+    :param scale: 缩放比例，小于1时读取缓存的缩小背景和小图
+    :return: (background_path, background, placements)
+    """
+    background_path, background = pick_background(background_files, rng, grayscale, procedural, scale)
+    if background is None:
+        return background_path, None, []
+
+    bg_height, bg_width = background.shape[:2]
+    placements = place_patches(img_folder, img_files, num_patches, bg_width, bg_height, rng, grayscale, scale)
+    return background_path, background, placements
+
+def compose_frame(background, placements, paste_workers=0, scale=1):
+    """
+    流水线的计算阶段：把预取阶段确定了位置的小图粘贴到背景上
+
+    :param scale: 缩放比例，平滑的高斯核同比例缩小
+
+    :return: (平滑后的合成图像, 目标掩码, 放置信息)
+    """
+    bg_height, bg_width = background.shape[:2]
+    target_mask_all = np.zeros((bg_height, bg_width, 3), dtype=np.uint8)
+
+    paste_patches(background, target_mask_all, placements, paste_workers)
+
+    # 对生成的图像进行平滑处理（高斯模糊，缩小时核同比例缩小）
+    ksize, sigma = scaled_gaussian(9, scale)
+    smoothed_background = cv2.GaussianBlur(background, (ksize, ksize), sigma)
+    return smoothed_background, target_mask_all, placements
+
+def run_pipeline(args, jobs):
+    """
+    流水线生成：后台线程预取背景和小图，主线程合成，另一个后台线程编码保存
+
+    :param jobs: [(index, num_patches), ...]
+    :return: 生成的 (图像路径, 目标路径) 列表
+    """
+    procedural = procedural_source(args)
+    background_files = list_background_files(args.background_dir) if procedural is None else []
+    img_files = list_patch_files(args.img_folder)
+    if (procedural is None and not background_files) or not img_files:
+        print(f"文件夹 {args.background_dir} 或 {args.img_folder} 中没有找到图片！")
+        return []
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    os.makedirs(args.output_target_dir, exist_ok=True)
+
+    # 每张图像使用独立的随机数生成器，种子在主线程中按顺序生成
+    jobs = [(index, num_patches, random.Random(random.getrandbits(64))) for index, num_patches in jobs]
+
+    def load(job):
+        _, num_patches, rng = job
+        return load_frame_inputs(background_files, img_files, args.img_folder, num_patches, rng, args.grayscale, procedural,
+                                 args.scale)
+
+    timer = StageTimer()
+    writer = BackgroundWriter(depth=args.write_depth, timer=timer)
+    generated = []
+    start = time.perf_counter()
+    try:
+        for (index, _, _), (background_path, background, placements) in prefetch(load, jobs, depth=args.prefetch_depth, timer=timer):
+            if background is None:
+                print(f"无法读取背景图片：{background_path}")
+                continue
+
+            with timer.stage('compose'):
+                smoothed_background, target_mask_all, placements = compose_frame(background, placements, args.paste_workers, args.scale)
+
+            output_path, target_output_path = output_paths(args.output_dir, args.output_target_dir, index)
+            writer.submit(output_path, export_image(smoothed_background, args.export_bgr))
+            writer.submit(target_output_path, target_mask_all)
+            if args.annotations:
+                write_annotations(target_output_path, output_path, target_mask_all, placements, args.annotations)
+            print(f"第 {index} 张图像已合成 (背景: {os.path.basename(background_path)}, 小图: {len(placements)})")
+            generated.append((output_path, target_output_path))
+    finally:
+        writer.close()
+    timer.report(time.perf_counter() - start)
+    return generated
+
+def generate_job(job, args):
+    """
+    在进程池中生成单张图像
+
+    :param job: (index, num_patches, seed)，每张图像使用独立种子，结果与进程数无关
+    """
+    index, num_patches, seed = job
+    random.seed(seed)
+    return add_multiple_patches_to_background(
+        args.background_dir,
+        args.img_folder,
+        num_patches=num_patches,
+        output_dir=args.output_dir,
+        output_target_dir=args.output_target_dir,
+        index=index,
+        paste_workers=args.paste_workers,
+        annotation_format=args.annotations,
+        grayscale=args.grayscale,
+        export_bgr=args.export_bgr,
+        procedural=procedural_source(args),
+        scale=args.scale
+    )
+
+def run_workers(args, jobs):
+    """
+    多进程生成：按档位和类别估计每张图像的耗时，分成耗时均衡的块后交给进程池
+
+    :param jobs: [(index, num_patches), ...]
+    :return: 生成的 (图像路径, 目标路径) 列表
+    """
+    jobs = [(index, num_patches, random.getrandbits(64)) for index, num_patches in jobs]
+    costs = [estimate_cost('yuyan', index, num_patches) for index, num_patches, _ in jobs]
+    results = run_balanced(partial(generate_job, args=args), jobs, costs, args.workers)
+    return [result for result in results if result[0] and result[1]]
+
 def main():
     parser = argparse.ArgumentParser(description='生成多组带气泡的背景图像')
     parser.add_argument('--runs', type=int, default=1000, help='运行生成过程的次数')
     parser.add_argument('--patches', type=int, default=50, help='每张图像中的气泡数量')
-    parser.add_argument('--background_dir', type=str, default="/media/qinyh/KINGSTON/MetaData/background_data_resized/yuyan", help='背景图像路径')
+    parser.add_argument('--background_dir', type=str, default="/media/qinyh/KINGSTON/MetaData/background_data_resized/yuyan", help='背景图像文件夹路径')
     parser.add_argument('--img_folder', type=str, default="/media/qinyh/KINGSTON/MetaData/yuyan_data", help='气泡图像文件夹路径')
     parser.add_argument('--output_dir', type=str, default="/media/qinyh/KINGSTON/GenData/yuyan/yuyan_random_make", help='输出目录')
     parser.add_argument('--output_target_dir', type=str, default="/media/qinyh/KINGSTON/GenData/yuyan/yuyan_target", help='输出目标目录')
     parser.add_argument('-i', '--index', type=int, default=52, help='开始索引')
-    
+    parser.add_argument('--paste_workers', type=int, default=0, help='并行粘贴小图的线程数（0或1表示顺序粘贴）')
+    parser.add_argument('--pipeline', action='store_true', help='使用流水线生成：后台预取背景和小图，后台编码保存（不能与 --workers 大于1同时使用）')
+    parser.add_argument('--prefetch_depth', type=int, default=2, help='流水线模式下预取队列的深度')
+    parser.add_argument('--write_depth', type=int, default=4, help='流水线模式下写入队列的深度')
+    parser.add_argument('--annotations', type=str, default=None, choices=['json', 'jsonl'], help='同时导出实例标注旁路文件（COCO风格json或紧凑jsonl）')
+    parser.add_argument('--grayscale', action='store_true', help='以单通道灰度图读取背景和小图，粘贴、平滑和编码都只处理一个通道')
+    parser.add_argument('--export_bgr', action='store_true', help='灰度模式下保存时将结果扩展为3通道')
+    parser.add_argument('--workers', type=int, default=1, help='并行生成的进程数，大于1时按估计耗时均衡分配任务')
+    parser.add_argument('--procedural_stats', type=str, default=None, help='背景统计文件（由 gen_common/procedural_background.py 生成；spectral 方式为 gen_common/spectral_background.py 估计的频谱模型，tiled 方式为循环平铺的小图），给定时不读取背景文件，每张图像在内存中生成新背景')
+    parser.add_argument('--procedural_mode', type=str, default='empirical', choices=['empirical', 'gaussian', 'spectral', 'tiled'], help='程序化背景的生成方式：经验分布、高斯分布、按功率谱整形的噪声或随机相位的循环平铺')
+
+    parser.add_argument('--scale', type=float, default=1.0, help='直接按训练分辨率生成的缩放比例（如 1920/5472），背景和小图使用缓存在素材文件夹 .scaled 子目录中的缩小副本；平滑的高斯核同比例缩小，小图掩码的膨胀已由 process_dilated_eroded.py 在原分辨率完成、随掩码一起按最近邻缩小，不另缩放形态学核')
+
     args = parser.parse_args()
 
-    # 确保背景目录存在
-    if not os.path.exists(args.background_dir):
+    if not 0 < args.scale <= 1:
+        print(f"错误: 缩放比例 {args.scale} 应在 (0, 1] 范围内")
+        return
+
+    if args.workers > 1 and args.pipeline:
+        print("错误: --pipeline 与 --workers 大于1不能同时使用（多进程生成不使用流水线），请只指定其中一个")
+        return
+
+    # 确保背景目录存在（程序化生成背景时不需要）
+    if not args.procedural_stats and not os.path.exists(args.background_dir):
         print(f"错误: 背景图片目录 '{args.background_dir}' 不存在！")
         return
-    
+
+    if args.workers > 1 or args.pipeline:
+        jobs = plan_jobs(args.index, args.runs)
+        if args.workers > 1:
+            generated = run_workers(args, jobs)
+        else:
+            generated = run_pipeline(args, jobs)
+        print(f"已成功生成 {len(generated)} 对图像")
+        return
+
+    procedural = procedural_source(args)
     generated_files = []
     generated_targets = []
     for i in range(args.runs):
         print(f"正在生成第 {i+args.index+1}/{args.runs} 张图像...")
-        if i + args.index < 200:
-            args.patches = random.randint(5, 10)   # 少量
-        elif i + args.index < 600:
-            args.patches = random.randint(10, 35)   # 中等
-        elif i + args.index < 1000:  # 因为args.runs=1000，所以这里的条件是i + args.index < 1000
-            args.patches = random.randint(35, 50)   # 大量
-        else:
+        args.patches = sample_num_patches(i + args.index)
+        if args.patches is None:
             break
 
         output_path, target_path = add_multiple_patches_to_background(
-            args.background_dir, 
-            args.img_folder, 
+            args.background_dir,
+            args.img_folder,
             num_patches=args.patches,
             output_dir=args.output_dir,
             output_target_dir=args.output_target_dir,
-            index=args.index + i
+            index=args.index + i,
+            paste_workers=args.paste_workers,
+            annotation_format=args.annotations,
+            grayscale=args.grayscale,
+            export_bgr=args.export_bgr,
+            procedural=procedural,
+            scale=args.scale
         )
-        generated_files.append(output_path)
-        generated_targets.append(target_path)
-    
+        if output_path and target_path:
+            generated_files.append(output_path)
+            generated_targets.append(target_path)
+
     print(f"已成功生成 {len(generated_files)} 对图像:")
     for img_path, target_path in zip(generated_files, generated_targets):
         print(f"  - 图像: {img_path}")
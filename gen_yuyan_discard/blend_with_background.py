@@ -2,14 +2,23 @@ import cv2
 import numpy as np
 import os
 import argparse
+import sys
+from concurrent.futures import ProcessPoolExecutor
 
-def blend_with_background(filtered_image_path, background_image_path, output_path):
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from gen_common.strips import run_strips
+from gen_common.blend_background import BLUR_KSIZE, resized_background
+from gen_common.scaled_assets import scaled_gaussian
+
+def blend_with_background(filtered_image_path, background_image_path, output_path, band_rows=0, scale=1):
     """
     将过滤后的图片与背景图片进行拼接，纯黑色部分使用背景图填充。
     
     :param filtered_image_path: 过滤后的图片路径
     :param background_image_path: 背景图片路径
     :param output_path: 拼接后的图片保存路径
+    :param band_rows: 大于0时按水平条带拼接并模糊，结果与整幅处理一致
+    :param scale: 输入按 random_make.py --scale 缩小生成时的缩放比例，高斯核同比例缩小
     :return: 操作是否成功
     """
     # 读取过滤后的图片
@@ -18,33 +27,50 @@ def blend_with_background(filtered_image_path, background_image_path, output_pat
         print(f"无法读取过滤后的图片: {filtered_image_path}")
         return False
 
-    # 读取背景图片
-    background_image = cv2.imread(background_image_path, cv2.IMREAD_GRAYSCALE)
+    # 读取背景图片，并调整大小与过滤后的图片一致（同一尺寸只解码、缩放一次）
+    background_image = resized_background(background_image_path, filtered_image.shape[1], filtered_image.shape[0])
     if background_image is None:
         print(f"无法读取背景图片: {background_image_path}")
         return False
 
-    # 调整背景图片大小与过滤后的图片一致
-    background_image = cv2.resize(background_image, (filtered_image.shape[1], filtered_image.shape[0]))
+    ksize, sigma = scaled_gaussian(BLUR_KSIZE, scale)
+    if band_rows > 0:
+        def blend_band(y0, y1):
+            rows = filtered_image[y0:y1]
+            return cv2.GaussianBlur(np.where(rows == 0, background_image[y0:y1], rows), (ksize, ksize), sigma)
 
-    # 将过滤图片的纯黑色部分（像素值为0）替换为背景图片的对应像素值
-    blended_image = np.where(filtered_image == 0, background_image, filtered_image)
+        # 每条带上下各多取核半径行做模糊，只写回中间部分
+        blended_image = run_strips(blend_band, filtered_image.shape[0], np.empty_like(filtered_image),
+                                   band_rows, halo=ksize // 2)
+    else:
+        # 将过滤图片的纯黑色部分（像素值为0）替换为背景图片的对应像素值
+        blended_image = np.where(filtered_image == 0, background_image, filtered_image)
 
-    # 对生成的图像进行平滑处理（高斯模糊）
-    blended_image = cv2.GaussianBlur(blended_image, (7, 7), 0)
+        # 对生成的图像进行平滑处理（高斯模糊）
+        blended_image = cv2.GaussianBlur(blended_image, (ksize, ksize), sigma)
 
     # 保存拼接后的图片
     cv2.imwrite(output_path, blended_image)
     print(f"拼接后的图片已保存到: {output_path}")
     return True
 
-def process_folder(input_folder, background_image_path, output_folder):
+def _init_worker():
+    # 每个进程只处理一张图，OpenCV内部不再开线程
+    cv2.setNumThreads(1)
+
+def _blend_task(task):
+    return blend_with_background(*task)
+
+def process_folder(input_folder, background_image_path, output_folder, band_rows=0, workers=1, scale=1):
     """
     处理文件夹中的所有图像，应用blend_with_background函数，并将结果保存到输出文件夹。
     
     :param input_folder: 输入图像文件夹路径
     :param background_image_path: 背景图像路径
     :param output_folder: 输出图像文件夹路径
+    :param band_rows: 大于0时按水平条带处理
+    :param workers: 并行处理的进程数，每个进程各自缓存缩放后的背景
+    :param scale: 输入的缩放比例，见 blend_with_background
     """
     # 确保输出文件夹存在
     os.makedirs(output_folder, exist_ok=True)
@@ -56,9 +82,7 @@ def process_folder(input_folder, background_image_path, output_folder):
         print(f"在文件夹 {input_folder} 中没有找到图像文件")
         return
     
-    processed_count = 0
-    failed_count = 0
-    
+    tasks = []
     for image_file in image_files:
         input_path = os.path.join(input_folder, image_file)
         
@@ -67,14 +91,19 @@ def process_folder(input_folder, background_image_path, output_folder):
         output_filename = f"{filename}_blend{ext}"
         output_path = os.path.join(output_folder, output_filename)
         
-        print(f"正在处理: {input_path}")
-        
-        success = blend_with_background(input_path, background_image_path, output_path)
-        
-        if success:
-            processed_count += 1
-        else:
-            failed_count += 1
+        tasks.append((input_path, background_image_path, output_path, band_rows, scale))
+    
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+            results = list(executor.map(_blend_task, tasks, chunksize=max(1, len(tasks) // (workers * 4))))
+    else:
+        results = []
+        for task in tasks:
+            print(f"正在处理: {task[0]}")
+            results.append(_blend_task(task))
+    
+    processed_count = sum(results)
+    failed_count = len(results) - processed_count
     
     print(f"\n处理完成! 成功处理: {processed_count} 张图像, 失败: {failed_count} 张图像")
 
@@ -84,9 +113,13 @@ def main():
     parser.add_argument('--background', type=str, default="gen_yuyan/Background/back_larger.png", help='背景图像路径')
     parser.add_argument('--output_folder', type=str, default="/home/qinyh/Downloads/yuyan_blend", help='输出图像文件夹路径')
     
+    parser.add_argument('--band_rows', type=int, default=0, help='按水平条带逐段处理时每条带的行数（如256），0表示整幅处理')
+    parser.add_argument('--workers', type=int, default=1, help='并行处理的进程数')
+    parser.add_argument('--scale', type=float, default=1.0, help='输入图像生成时的缩放比例（与 random_make.py --scale 相同），平滑的高斯核同比例缩小')
+    
     args = parser.parse_args()
     
-    process_folder(args.input_folder, args.background, args.output_folder)
+    process_folder(args.input_folder, args.background, args.output_folder, args.band_rows, args.workers, args.scale)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,12 +1,17 @@
 import cv2
-import numpy as np
 import argparse
 import os
+import sys
 from math import ceil
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from gen_common.tiled_background import TiledBackground
+
 def create_large_image_from_tile(input_image_path, output_image_path, target_width=5472, target_height=3648):
     """
     读取一张图片，获取其分辨率，然后通过拼接方法创建一张指定大小的图像
+
+    合成时不需要先生成大图：random_make.py 的 --tile 直接以小图为平铺单元，按需生成（并随机平移）背景。
     
     Args:
         input_image_path: 输入图像路径
@@ -29,29 +34,14 @@ def create_large_image_from_tile(input_image_path, output_image_path, target_wid
     tile_height, tile_width, channels = tile.shape
     print(f"输入图像分辨率: {tile_width} x {tile_height}")
     
-    # 创建目标大小的空白图像
-    large_image = np.zeros((target_height, target_width, channels), dtype=np.uint8)
-    
     # 计算需要多少个瓦片来填充大图像
     tiles_x = ceil(target_width / tile_width)
     tiles_y = ceil(target_height / tile_height)
     
     print(f"需要拼接 {tiles_x} x {tiles_y} 个瓦片")
     
-    # 通过重复拼贴填充大图像
-    for y in range(tiles_y):
-        for x in range(tiles_x):
-            # 计算当前瓦片应放置的位置
-            pos_x = x * tile_width
-            pos_y = y * tile_height
-            
-            # 计算实际可用的瓦片大小（处理边缘情况）
-            actual_width = min(tile_width, target_width - pos_x)
-            actual_height = min(tile_height, target_height - pos_y)
-            
-            # 只有当有足够空间时才放置瓦片
-            if actual_width > 0 and actual_height > 0:
-                large_image[pos_y:pos_y+actual_height, pos_x:pos_x+actual_width] = tile[:actual_height, :actual_width]
+    # 从左上角开始循环平铺，一次生成整幅图像
+    large_image = TiledBackground(tile, target_width, target_height).materialize()
     
     # 保存结果
     cv2.imwrite(output_image_path, large_image)
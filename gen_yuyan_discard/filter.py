@@ -2,8 +2,17 @@ import cv2
 import numpy as np
 import os
 import argparse
+import sys
+from concurrent.futures import ProcessPoolExecutor
 
-def apply_gray_mask_with_fill(image_path, output_path, lower_threshold, upper_threshold, erosion_iterations=2, dilation_iterations=2):
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from gen_common.gray_mask import threshold_lut, gray_mask_fill, keep_masked
+from gen_common.scaled_assets import scaled_size
+
+# 腐蚀和膨胀的核大小（全分辨率下的像素数）
+MORPH_KSIZE = 15
+
+def apply_gray_mask_with_fill(image_path, output_path, lower_threshold, upper_threshold, erosion_iterations=2, dilation_iterations=2, lut=None, scale=1):
     """
     对灰度图片应用灰色掩模，保留阈值范围内部分，并填充不规则环形内部。
     
@@ -11,6 +20,8 @@ def apply_gray_mask_with_fill(image_path, output_path, lower_threshold, upper_th
     :param output_path: 输出图片的保存路径
     :param lower_threshold: 灰度下限阈值
     :param upper_threshold: 灰度上限阈值
+    :param lut: 预先计算的阈值查找表，None时按阈值计算
+    :param scale: 输入按 random_make.py --scale 缩小生成时的缩放比例，腐蚀和膨胀的核同比例缩小（至少为1）
     """
     # 读取灰度图片
     image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
@@ -18,35 +29,36 @@ def apply_gray_mask_with_fill(image_path, output_path, lower_threshold, upper_th
         print(f"无法读取图片: {image_path}")
         return False
 
-    # 应用灰度掩模，保留在下限阈值到上限阈值之间的像素
-    print(upper_threshold, lower_threshold)
-    masked_image = np.where((image >= upper_threshold) | (image <= lower_threshold), image, 0).astype(np.uint8)
-
-    # 找到轮廓
-    contours, _ = cv2.findContours(masked_image, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if lut is None:
+        lut = threshold_lut(lower_threshold, upper_threshold)
 
-    # 创建一个空白图像用于绘制填充后的轮廓
-    filled_image = np.zeros_like(image)
-
-    # 填充轮廓内部
-    cv2.drawContours(filled_image, contours, -1, (255), thickness=cv2.FILLED)
+    # 查表得到阈值掩模（保留 >= 上限或 <= 下限的像素），并填充外轮廓内部的孔洞
+    filled_image = gray_mask_fill(image, lut)
 
     # 腐蚀操作
-    kernel = np.ones((15, 15), np.uint8)  # 定义一个 3x3 的核
+    kernel = np.ones(scaled_size(MORPH_KSIZE, MORPH_KSIZE, scale), np.uint8)
     eroded_image = cv2.erode(filled_image, kernel, iterations=erosion_iterations)
 
     # 膨胀操作
     dilated_image = cv2.dilate(eroded_image, kernel, iterations=dilation_iterations)
 
     # 在填充的区域内保留原始灰度值
-    result_image = np.where(dilated_image == 255, image, 0)
+    result_image = keep_masked(image, dilated_image)
 
     # 保存处理后的图片
     cv2.imwrite(output_path, result_image)
     print(f"处理后的图片已保存到: {output_path}")
     return True
 
-def process_folder(input_folder, output_folder, lower_threshold, upper_threshold):
+def _init_worker():
+    # 每个进程只处理一张图，OpenCV内部不再开线程
+    cv2.setNumThreads(1)
+
+def _filter_task(task):
+    input_path, output_path, lower_threshold, upper_threshold, lut, scale = task
+    return apply_gray_mask_with_fill(input_path, output_path, lower_threshold, upper_threshold, lut=lut, scale=scale)
+
+def process_folder(input_folder, output_folder, lower_threshold, upper_threshold, workers=1, scale=1):
     """
     处理文件夹中的所有图像，应用灰度掩模和填充，并在输出文件夹中保存结果。
     
@@ -54,6 +66,8 @@ def process_folder(input_folder, output_folder, lower_threshold, upper_threshold
     :param output_folder: 输出文件夹路径
     :param lower_threshold: 灰度下限阈值
     :param upper_threshold: 灰度上限阈值
+    :param workers: 并行处理的进程数
+    :param scale: 输入的缩放比例，见 apply_gray_mask_with_fill
     """
     # 确保输出文件夹存在
     os.makedirs(output_folder, exist_ok=True)
@@ -65,9 +79,11 @@ def process_folder(input_folder, output_folder, lower_threshold, upper_threshold
         print(f"在文件夹 {input_folder} 中没有找到图像文件")
         return
     
-    processed_count = 0
-    failed_count = 0
-    
+    # 阈值查找表只计算一次，随任务分发给各进程
+    print(f"灰度阈值: 下限 {lower_threshold}, 上限 {upper_threshold}")
+    lut = threshold_lut(lower_threshold, upper_threshold)
+
+    tasks = []
     for image_file in image_files:
         input_path = os.path.join(input_folder, image_file)
         
@@ -75,16 +91,19 @@ def process_folder(input_folder, output_folder, lower_threshold, upper_threshold
         filename, ext = os.path.splitext(image_file)
         output_filename = f"{filename}_filter{ext}"
         output_path = os.path.join(output_folder, output_filename)
-        
-        print(f"正在处理: {input_path}")
-        
-        success = apply_gray_mask_with_fill(input_path, output_path, lower_threshold, upper_threshold)
-        
-        if success:
-            processed_count += 1
-        else:
-            failed_count += 1
+        tasks.append((input_path, output_path, lower_threshold, upper_threshold, lut, scale))
+    
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+            results = list(executor.map(_filter_task, tasks))
+    else:
+        results = []
+        for task in tasks:
+            print(f"正在处理: {task[0]}")
+            results.append(_filter_task(task))
     
+    processed_count = sum(results)
+    failed_count = len(results) - processed_count
     print(f"\n处理完成! 成功处理: {processed_count} 张图像, 失败: {failed_count} 张图像")
 
 def main():
@@ -93,10 +112,12 @@ def main():
     parser.add_argument('--output_folder', type=str, default="/home/qinyh/Downloads/yuyan_filter", help='输出图像文件夹路径')
     parser.add_argument('--lower_threshold', type=int, default=80, help='灰度下限阈值')
     parser.add_argument('--upper_threshold', type=int, default=900, help='灰度上限阈值')
+    parser.add_argument('--workers', type=int, default=1, help='并行处理的进程数')
+    parser.add_argument('--scale', type=float, default=1.0, help='输入图像生成时的缩放比例（与 random_make.py --scale 相同），腐蚀和膨胀的核同比例缩小')
     
     args = parser.parse_args()
     
-    process_folder(args.input_folder, args.output_folder, args.lower_threshold, args.upper_threshold)
+    process_folder(args.input_folder, args.output_folder, args.lower_threshold, args.upper_threshold, args.workers, args.scale)
 
 if __name__ == "__main__":
     main()
@@ -1,27 +1,16 @@
 import os
+import argparse
+import sys
+from concurrent.futures import ProcessPoolExecutor
 import cv2
 import numpy as np
-from scipy.stats import norm
-
-def calculate_average_distribution(input_folder):
-    """计算所有图像边缘像素的高斯分布参数的平均值"""
-    means = []
-    stds = []
-    for filename in os.listdir(input_folder):
-        if filename.endswith(('.png', '.jpg', '.jpeg', '.bmp', '.tiff')):
-            filepath = os.path.join(input_folder, filename)
-            image = cv2.imread(filepath, cv2.IMREAD_GRAYSCALE)
-            edge_pixels = get_edge_pixels(image)
-            if len(edge_pixels) > 0:  # 确保有边缘像素
-                mean = np.mean(edge_pixels)
-                std = np.std(edge_pixels)
-                means.append(mean)
-                stds.append(std)
-                print(f"图片: {filename}, 边缘像素均值: {mean:.2f}, 标准差: {std:.2f}")
-    # 计算均值和标准差的平均值
-    avg_mean = np.mean(means) if means else 0
-    avg_std = np.mean(stds) if stds else 1  # 避免标准差为0
-    return avg_mean, avg_std
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from gen_common.stats_cache import open_cache
+
+def list_patch_files(input_folder):
+    """返回需要处理的图片文件名"""
+    return [f for f in os.listdir(input_folder) if f.endswith(('.png', '.jpg', '.jpeg', '.bmp', '.tiff'))]
 
 def get_edge_pixels(image):
     """提取图像上下左右四个边缘的像素值"""
@@ -36,45 +25,119 @@ def get_edge_pixels(image):
     edge_pixels = np.concatenate([top_edge, bottom_edge, left_edge, right_edge])
     return edge_pixels
 
+def edge_stats(filepath):
+    """读取图片并计算边缘像素的均值和标准差，读取失败时返回None"""
+    image = cv2.imread(filepath, cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        return None
+    edge_pixels = get_edge_pixels(image)
+    return float(np.mean(edge_pixels)), float(np.std(edge_pixels))
+
+def distribution_lut(source_mean, source_std, target_mean, target_std):
+    """
+    构造把源分布线性映射到目标分布的256级查找表
+
+    对每个灰度级做与逐像素计算相同的 float64 运算，查表结果与对整张图片计算完全一致。
+
+    :return: (256,) 的 uint8 查找表，源标准差为0时返回None（保持原图）
+    """
+    if source_std == 0:  # 避免除以0
+        return None
+    levels = np.arange(256, dtype=np.uint8)
+    matched = (levels - source_mean) / source_std * target_std + target_mean
+    return np.clip(matched, 0, 255).astype(np.uint8)
+
 def match_distribution(image, edge_pixels, target_mean, target_std):
     """将整张图片调整为目标高斯分布，但使边缘像素保持目标分布"""
-    source_mean = np.mean(edge_pixels)
-    source_std = np.std(edge_pixels)
-    if source_std == 0:  # 避免除以0
+    lut = distribution_lut(np.mean(edge_pixels), np.std(edge_pixels), target_mean, target_std)
+    if lut is None:
         return image
+    return cv2.LUT(image, lut)
+
+def adjust_image(task):
+    """
+    按第一遍得到的边缘统计调整一张图片并保存
 
-    # 标准化整张图片
-    normalized_image = (image - source_mean) / source_std
-    # 调整到目标分布
-    matched_image = normalized_image * target_std + target_mean
-    return np.clip(matched_image, 0, 255).astype(np.uint8)
+    :param task: (输入路径, 输出路径, 源均值, 源标准差, 目标均值, 目标标准差)
+    :return: 是否成功
+    """
+    filepath, output_path, source_mean, source_std, target_mean, target_std = task
+    image = cv2.imread(filepath, cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        return False
+    lut = distribution_lut(source_mean, source_std, target_mean, target_std)
+    adjusted_image = image if lut is None else cv2.LUT(image, lut)
+    cv2.imwrite(output_path, adjusted_image)
+    return True
 
-def process_images(input_folder, output_folder):
+def _init_worker():
+    # 每个进程只处理一张图，OpenCV内部不再开线程
+    cv2.setNumThreads(1)
+
+def _map(func, items, workers):
+    """workers 大于1时在进程池中按顺序执行"""
+    if workers > 1 and len(items) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+            return list(executor.map(func, items, chunksize=max(1, len(items) // (workers * 4))))
+    return [func(item) for item in items]
+
+def calculate_average_distribution(input_folder, workers=1, use_cache=True):
+    """
+    计算所有图像边缘像素的高斯分布参数的平均值
+
+    :param use_cache: 是否使用输入文件夹中的统计缓存，已统计过的图片不再解码
+    :return: (平均均值, 平均标准差, {文件名: (均值, 标准差)})，每张图片的统计留给第二遍直接使用
+    """
+    filenames = list_patch_files(input_folder)
+    filepaths = [os.path.join(input_folder, f) for f in filenames]
+    cache = open_cache(input_folder, use_cache)
+    if cache is not None:
+        results = cache.map(filepaths, 'border_mean_std', edge_stats, workers)
+        cache.close()
+    else:
+        results = _map(edge_stats, filepaths, workers)
+
+    image_stats = {}
+    for filename, stats in zip(filenames, results):
+        if stats is None:
+            print(f"无法读取图像：{filename}")
+            continue
+        mean, std = stats
+        image_stats[filename] = (mean, std)
+        print(f"图片: {filename}, 边缘像素均值: {mean:.2f}, 标准差: {std:.2f}")
+    # 计算均值和标准差的平均值
+    means = [s[0] for s in image_stats.values()]
+    stds = [s[1] for s in image_stats.values()]
+    avg_mean = np.mean(means) if means else 0
+    avg_std = np.mean(stds) if stds else 1  # 避免标准差为0
+    return avg_mean, avg_std, image_stats
+
+def process_images(input_folder, output_folder, workers=1, use_cache=True):
     """处理文件夹中的所有图片"""
     if not os.path.exists(output_folder):
         os.makedirs(output_folder)
 
     # 计算目标高斯分布参数
-    target_mean, target_std = calculate_average_distribution(input_folder)
+    target_mean, target_std, image_stats = calculate_average_distribution(input_folder, workers, use_cache)
     print(f"目标高斯分布参数: 均值={target_mean}, 标准差={target_std}")
 
-    for filename in os.listdir(input_folder):
-        if filename.endswith(('.png', '.jpg', '.jpeg', '.bmp', '.tiff')):
-            filepath = os.path.join(input_folder, filename)
-            image = cv2.imread(filepath, cv2.IMREAD_GRAYSCALE)
-            
-            # 提取边缘像素值
-            edge_pixels = get_edge_pixels(image)
-            
-            # 调整整张图片，使边缘像素保持目标分布
-            adjusted_image = match_distribution(image, edge_pixels, target_mean, target_std)
-            
-            # 保存处理后的图片
-            output_path = os.path.join(output_folder, filename)
-            cv2.imwrite(output_path, adjusted_image)
-
-# 主程序
-input_folder = "sample_generation_yuyan/yuyan_copy"  # 替换为你的输入文件夹路径
-output_folder = "sample_generation_yuyan/yuyan_matched"  # 替换为你的输出文件夹路径
-
-process_images(input_folder, output_folder)
\ No newline at end of file
+    # 调整整张图片，使边缘像素保持目标分布；每张图片只用一次查表
+    tasks = [(os.path.join(input_folder, filename), os.path.join(output_folder, filename),
+              mean, std, target_mean, target_std)
+             for filename, (mean, std) in image_stats.items()]
+    done = sum(_map(adjust_image, tasks, workers))
+    print(f"已调整 {done} 张图片，保存到 {output_folder}")
+
+def main():
+    parser = argparse.ArgumentParser(description='按所有图片边缘像素的平均分布调整每张图片的灰度分布')
+    parser.add_argument('--input_folder', type=str, default="sample_generation_yuyan/yuyan_copy", help='输入文件夹路径')
+    parser.add_argument('--output_folder', type=str, default="sample_generation_yuyan/yuyan_matched", help='输出文件夹路径')
+    parser.add_argument('--workers', type=int, default=1, help='并行处理的进程数')
+    parser.add_argument('--no_stats_cache', action='store_true', help='不使用输入文件夹中的统计缓存，重新计算所有图片的边缘统计')
+
+    args = parser.parse_args()
+
+    process_images(args.input_folder, args.output_folder, args.workers, not args.no_stats_cache)
+
+if __name__ == "__main__":
+    main()
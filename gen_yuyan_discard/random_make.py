@@ -4,10 +4,23 @@ import random
 import numpy as np
 import time
 import argparse
+import sys
 from datetime import datetime
 
-def add_multiple_patches_to_background(background_path, img_folder, num_patches=5, output_dir="gen_qipao/output", output_target_dir="gen_qipao/output_target"):
-    background = cv2.imread(background_path)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from gen_common.tiled_background import TiledBackground
+
+def add_multiple_patches_to_background(background_path, img_folder, num_patches=5, output_dir="gen_qipao/output", output_target_dir="gen_qipao/output_target",
+                                       tiled=None):
+    """
+    在背景上随机放置多张小图，并生成对应的目标掩码
+
+    :param tiled: 可选的 TiledBackground，给定时每张图像随机平移平铺相位，在内存中生成背景，不读取背景文件
+    """
+    if tiled is not None:
+        background = tiled.generate(random.getrandbits(64))
+    else:
+        background = cv2.imread(background_path)
 
     # 获取背景图片的大小
     bg_height, bg_width, _ = background.shape
@@ -91,9 +104,19 @@ def main():
     parser.add_argument('--img_folder', type=str, default="/home/qinyh/Downloads/yuyan_final", help='气泡图像文件夹路径')
     parser.add_argument('--output_dir', type=str, default="/home/qinyh/Downloads/yuyan_output", help='输出目录')
     parser.add_argument('--output_target_dir', type=str, default="/home/qinyh/Downloads/yuyan_target", help='输出目标目录')
+    parser.add_argument('--tile', type=str, default=None, help='平铺用的小图路径，给定时不读取 --background，直接按小图循环平铺（每张随机平移）生成背景')
+    parser.add_argument('--width', type=int, default=5472, help='平铺背景的宽度')
+    parser.add_argument('--height', type=int, default=3648, help='平铺背景的高度')
     
     args = parser.parse_args()
     
+    tiled = None
+    if args.tile:
+        tiled = TiledBackground.from_file(args.tile, args.width, args.height)
+        if tiled is None:
+            print(f"无法读取平铺小图：{args.tile}")
+            return
+    
     generated_files = []
     generated_targets = []
     for i in range(args.runs):
@@ -104,6 +127,7 @@ def main():
             num_patches=args.patches,
             output_dir=args.output_dir,
             output_target_dir=args.output_target_dir,
+            tiled=tiled,
         )
         generated_files.append(output_path)
         generated_targets.append(target_path)
@@ -0,0 +1,35 @@
+import os
+import sys
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from gen_common.filter_blend import png_gray
+
+
+def _png_roundtrip_gray(image):
+    ok, encoded = cv2.imencode('.png', image)
+    assert ok
+    return cv2.imdecode(encoded, cv2.IMREAD_GRAYSCALE)
+
+
+def test_png_gray_matches_png_grayscale_decode():
+    """png_gray 依赖 OpenCV 所带 libpng 的 RGB->灰度定点系数，换用其他 OpenCV/libpng 版本时由这里发现差异"""
+    rng = np.random.default_rng(0)
+    for height, width in [(1, 1), (37, 53), (256, 384)]:
+        image = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+        assert np.array_equal(png_gray(image), _png_roundtrip_gray(image))
+
+
+def test_png_gray_matches_on_all_channel_combinations_of_a_grid():
+    """每个通道取 0..255 中间隔为5的全部组合（含两端），覆盖截断取整的边界"""
+    levels = np.arange(0, 256, 5, dtype=np.uint8)
+    b, g, r = np.meshgrid(levels, levels, levels, indexing='ij')
+    image = np.stack([b, g, r], axis=-1).reshape(len(levels), -1, 3)
+    assert np.array_equal(png_gray(image), _png_roundtrip_gray(image))
+
+
+def test_png_gray_keeps_single_channel():
+    image = np.arange(256, dtype=np.uint8).reshape(16, 16)
+    assert png_gray(image) is image
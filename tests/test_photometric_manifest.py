@@ -0,0 +1,64 @@
+import os
+import sys
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'gen_background'))
+import cast_shadow
+import change_background_light
+
+
+def _write_images(folder, count=4):
+    rng = np.random.default_rng(0)
+    for i in range(count):
+        cv2.imwrite(os.path.join(folder, f"img{i}.png"), rng.integers(0, 256, (48, 64), dtype=np.uint8))
+
+
+def _pngs(folder):
+    return sorted(f for f in os.listdir(folder) if f.endswith('.png'))
+
+
+def test_light_pass_processes_shadow_outputs(tmp_path):
+    """先加阴影再加光照（同一文件夹、共用清单）时，光照处理必须把 _shadow 图像也当作输入"""
+    folder = str(tmp_path)
+    _write_images(folder)
+
+    cast_shadow.process_folder(folder, folder, seed=1)
+    assert len(_pngs(folder)) == 8
+
+    change_background_light.process_folder(folder, folder, seed=2)
+    names = _pngs(folder)
+    assert len(names) == 16
+    for i in range(4):
+        assert f"img{i}_shadow_light.png" in names
+
+
+def test_rerun_skips_own_outputs(tmp_path):
+    """同一处理重复运行时跳过已处理的源图和自己的输出"""
+    folder = str(tmp_path)
+    _write_images(folder)
+
+    cast_shadow.process_folder(folder, folder, seed=1)
+    cast_shadow.process_folder(folder, folder, seed=1)
+    assert len(_pngs(folder)) == 8
+
+
+def test_recover_only_touches_own_temp_files(tmp_path):
+    """断点恢复只清理本次处理输出的临时文件，其他 .tmp 文件（用户文件、另一处理正在写的输出）保持不动"""
+    folder = str(tmp_path)
+    _write_images(folder)
+    foreign = ['notes.tmp', 'img0_light.png.tmp']
+    for name in foreign + ['img0_shadow.png.tmp']:
+        with open(os.path.join(folder, name), 'wb') as f:
+            f.write(b'partial')
+
+    cast_shadow.process_folder(folder, folder, seed=1)
+
+    names = os.listdir(folder)
+    for name in foreign:
+        assert name in names
+    # 本次处理自己未记录在清单中的临时文件被删除，输出正常写出
+    assert 'img0_shadow.png.tmp' not in names
+    assert 'img0_shadow.png' in names